@@ -1,6 +1,26 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
+def serving():
+    """False in manage.py commands other than runserver (migrate, test, ...) and the autoreloader parent"""
+    from django.core.management import get_commands
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'runserver':
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+    return command not in get_commands()
+
+
 class EvstationmasterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'EVStationMaster'
+
+    def ready(self):
+        # Build the typeahead index at startup so the first request does not pay for it
+        if serving():
+            from EVStationMaster.typeahead import station_typeahead
+
+            station_typeahead.warm()
@@ -0,0 +1,276 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from EVStationMaster.occupancy import booking_time, day_bounds, day_of
+
+# Booking chargerType values are the StationDetails capacity fields
+CHARGER_TYPES = ('rapidcharger', 'fastCharger', 'slowcharger')
+CHARGER_ALIASES = {'rapid': 'rapidcharger', 'fast': 'fastCharger', 'slow': 'slowcharger'}
+
+# Bookings that hold a charger: accepted ones and requests still awaiting a decision
+HOLDING_STATUSES = ('Accept', 'Request Pending', 'Pending')
+
+# A day's schedule also covers the next day, so slots running past midnight are checked in full
+HORIZON = timedelta(days=2)
+MAX_BOOKING = timedelta(days=1)
+
+
+def charger_pool(charger_type):
+    """StationDetails capacity field for a chargerType (or rapid/fast/slow), else None"""
+    pool = CHARGER_ALIASES.get((charger_type or '').lower(), charger_type)
+    return pool if pool in CHARGER_TYPES else None
+
+
+class MaxSegmentTree:
+    """Range maximum and first-index-at-least queries in O(log n)"""
+
+    def __init__(self, values):
+        self.n = len(values)
+        self.size = 1
+        while self.size < max(self.n, 1):
+            self.size *= 2
+        self.tree = [float('-inf')] * (2 * self.size)
+        self.tree[self.size:self.size + self.n] = values
+        for i in range(self.size - 1, 0, -1):
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def max(self, lo, hi):
+        """Maximum of values[lo:hi]"""
+        result = float('-inf')
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                result = max(result, self.tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                result = max(result, self.tree[hi])
+            lo //= 2
+            hi //= 2
+        return result
+
+    def first_at_least(self, lo, value):
+        """Smallest index >= lo whose value is >= value, or None"""
+        return self._first(1, 0, self.size, lo, value)
+
+    def _first(self, node, node_lo, node_hi, lo, value):
+        if node_hi <= lo or self.tree[node] < value:
+            return None
+        if node >= self.size:
+            return node - self.size
+        mid = (node_lo + node_hi) // 2
+        found = self._first(2 * node, node_lo, mid, lo, value)
+        if found is None:
+            found = self._first(2 * node + 1, mid, node_hi, lo, value)
+        return found
+
+
+class PoolSchedule:
+    """Concurrent usage of one charger pool over [start, end) as a step function
+
+    Built with a sweep over the booking intervals; usage[i] holds on [times[i], times[i+1]).
+    Maximal runs with a free charger are kept as windows for next-free-slot search.
+    """
+
+    def __init__(self, intervals, capacity, start, end):
+        self.capacity = capacity
+        self.start = start
+        self.end = end
+
+        deltas = {}
+        for begin, finish in intervals:
+            begin, finish = max(begin, start), min(finish, end)
+            if begin < finish:
+                deltas[begin] = deltas.get(begin, 0) + 1
+                deltas[finish] = deltas.get(finish, 0) - 1
+
+        self.times = [start]
+        self.usage = [0]
+        for moment in sorted(deltas):
+            level = self.usage[-1] + deltas[moment]
+            if moment == self.times[-1]:
+                self.usage[-1] = level
+            elif level != self.usage[-1]:
+                self.times.append(moment)
+                self.usage.append(level)
+        self.usage_tree = MaxSegmentTree(self.usage)
+
+        self.window_starts = []
+        self.window_ends = []
+        bounds = self.times[1:] + [end]
+        for moment, finish, level in zip(self.times, bounds, self.usage):
+            if level >= capacity or moment >= end:
+                continue
+            if self.window_ends and self.window_ends[-1] == moment:
+                self.window_ends[-1] = finish
+            else:
+                self.window_starts.append(moment)
+                self.window_ends.append(finish)
+        self.window_tree = MaxSegmentTree([
+            (finish - begin).total_seconds() for begin, finish in zip(self.window_starts, self.window_ends)
+        ])
+
+    def in_use(self, when):
+        i = bisect_right(self.times, when) - 1
+        return self.usage[i] if i >= 0 else 0
+
+    def is_free(self, start, duration):
+        """Whether a charger stays free for all of [start, start + duration)"""
+        if self.capacity <= 0:
+            return False
+        first = max(bisect_right(self.times, start) - 1, 0)
+        last = bisect_left(self.times, start + duration)
+        return self.usage_tree.max(first, max(last, first + 1)) < self.capacity
+
+    def next_free(self, after, duration, latest_start):
+        """Earliest start >= after with a free charger for `duration`, starting before latest_start"""
+        k = bisect_right(self.window_ends, after)
+        if k == len(self.window_ends):
+            return None
+        begin = max(self.window_starts[k], after)
+        if self.window_ends[k] - begin < duration:
+            # Later windows all start after `after`, so only their length matters
+            k = self.window_tree.first_at_least(k + 1, duration.total_seconds())
+            if k is None or k >= len(self.window_starts):
+                return None
+            begin = self.window_starts[k]
+        return begin if begin < latest_start else None
+
+
+class StationDaySchedule:
+    """Charger pools of one station for slots starting on one day"""
+
+    def __init__(self, station, day):
+        from EVStationMaster.models import SlotBooking
+
+        self.day = day
+        self.start, self.day_end = day_bounds(day)
+        self.end = self.start + HORIZON
+
+        # Served by the (stationId, status, arrivalTime) index
+        bookings = SlotBooking.objects.filter(
+            stationId=station.stationId,
+            status__in=HOLDING_STATUSES,
+            arrivalTime__gte=self.start - MAX_BOOKING,
+            arrivalTime__lt=self.end,
+        ).values_list('chargerType', 'arrivalTime', 'time')
+
+        intervals = {pool: [] for pool in CHARGER_TYPES}
+        for charger_type, arrival, minutes in bookings:
+            pool = charger_pool(charger_type)
+            if pool is not None:
+                intervals[pool].append((arrival, arrival + timedelta(minutes=minutes or 0)))
+
+        self.pools = {
+            pool: PoolSchedule(intervals[pool], getattr(station, pool) or 0, self.start, self.end)
+            for pool in CHARGER_TYPES
+        }
+        self.built_at = time.monotonic()
+
+
+def has_capacity_for(station, booking):
+    """Whether accepting `booking` keeps accepted bookings within the pool's capacity
+
+    Call inside the transaction that holds the station row lock, so concurrent
+    admissions for the station are checked one after another.
+    """
+    from EVStationMaster.models import SlotBooking
+
+    pool = charger_pool(booking.chargerType)
+    capacity = (getattr(station, pool) or 0) if pool else 0
+    if capacity <= 0:
+        return False
+
+    start = booking_time(booking.arrivalTime)
+    duration = timedelta(minutes=max(booking.time or 0, 1))
+    accepted = SlotBooking.objects.filter(
+        stationId=station.stationId,
+        status='Accept',
+        arrivalTime__gte=start - MAX_BOOKING,
+        arrivalTime__lt=start + duration,
+    ).exclude(pk=booking.pk).values_list('chargerType', 'arrivalTime', 'time')
+
+    intervals = [
+        (arrival, arrival + timedelta(minutes=minutes or 0))
+        for charger_type, arrival, minutes in accepted if charger_pool(charger_type) == pool
+    ]
+    return PoolSchedule(intervals, capacity, start, start + duration).is_free(start, duration)
+
+
+class AvailabilityIndex:
+    """LRU of per-station, per-day charger schedules answering availability queries"""
+
+    def __init__(self, max_entries=1024, refresh_interval=60):
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval  # seconds, picks up bookings made by other workers
+        self.schedules = OrderedDict()  # (stationId, day) -> StationDaySchedule
+        self.lock = threading.Lock()
+
+    def schedule(self, station, day, fresh=False):
+        key = (station.stationId, day)
+        with self.lock:
+            cached = self.schedules.get(key)
+            if cached is not None and not fresh and time.monotonic() - cached.built_at <= self.refresh_interval:
+                self.schedules.move_to_end(key)
+                return cached
+
+        built = StationDaySchedule(station, day)
+        with self.lock:
+            self.schedules[key] = built
+            self.schedules.move_to_end(key)
+            while len(self.schedules) > self.max_entries:
+                self.schedules.popitem(last=False)
+        return built
+
+    def invalidate(self, station_id, when=None):
+        """Drop cached schedules a booking at `when` (or any booking of the station) affects"""
+        with self.lock:
+            if when is None:
+                stale = [key for key in self.schedules if key[0] == station_id]
+            else:
+                day = day_of(when)
+                stale = [(station_id, day), (station_id, day - timedelta(days=1))]
+            for key in stale:
+                self.schedules.pop(key, None)
+
+    def free_chargers(self, station, charger_type, when, fresh=False):
+        pool = charger_pool(charger_type)
+        if pool is None:
+            return 0
+        when = booking_time(when)
+        schedule = self.schedule(station, day_of(when), fresh).pools[pool]
+        return max(schedule.capacity - schedule.in_use(when), 0)
+
+    def is_free(self, station, charger_type, start, minutes, fresh=False):
+        """Whether a charger of this type is free for [start, start + minutes)"""
+        pool = charger_pool(charger_type)
+        if pool is None:
+            return False
+        start = booking_time(start)
+        schedule = self.schedule(station, day_of(start), fresh).pools[pool]
+        return schedule.is_free(start, timedelta(minutes=max(minutes, 1)))
+
+    def next_free_slot(self, station, charger_type, after, minutes, days=7, fresh=False):
+        """Earliest start >= after with a free charger for `minutes`, searching up to `days` days"""
+        pool = charger_pool(charger_type)
+        if pool is None or not getattr(station, pool):
+            return None
+        duration = timedelta(minutes=max(minutes, 1))
+        after = booking_time(after)
+        day = day_of(after)
+        for offset in range(days):
+            schedule = self.schedule(station, day + timedelta(days=offset), fresh)
+            found = schedule.pools[pool].next_free(max(after, schedule.start), duration, schedule.day_end)
+            if found is not None:
+                # Stored arrival times come back in UTC; report the slot in local time
+                return timezone.localtime(found) if timezone.is_aware(found) else found
+        return None
+
+
+station_availability = AvailabilityIndex()
@@ -0,0 +1,36 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; works on scalars or NumPy arrays"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def equirectangular_km(lat1, lng1, lat2, lng2):
+    """Flat-earth approximation in km, accurate for short ranges"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lng1, lat2, lng2))
+    x = (lng2 - lng1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_KM * np.sqrt(x * x + y * y)
+
+
+def distance_km(lat1, lng1, lat2, lng2, method='haversine'):
+    """Distance between points in km using 'haversine' or 'equirectangular'"""
+    if method == 'equirectangular':
+        return equirectangular_km(lat1, lng1, lat2, lng2)
+    return haversine_km(lat1, lng1, lat2, lng2)
+
+
+def min_distance_outside_km(lat, degrees):
+    """Lower bound on the distance to any point more than `degrees` away in lat or lng"""
+    # Either the latitude gap is at least `degrees`, or the point lies within
+    # `degrees` of our latitude and the longitude gap is at least `degrees`
+    lat_bound = degrees * KM_PER_DEGREE
+    max_lat = np.radians(min(90.0, abs(lat) + degrees))
+    lng_bound = 2 * EARTH_RADIUS_KM * np.cos(max_lat) * np.sin(np.radians(min(degrees, 180.0)) / 2)
+    return float(min(lat_bound, lng_bound))
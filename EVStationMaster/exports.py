@@ -0,0 +1,137 @@
+import csv
+import io
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+BOOKING_EXPORT_FIELDS = (
+    'id', 'stationId', 'stationName', 'customerName', 'vehicleRegistration', 'chargerType',
+    'arrivalTime', 'status', 'userRemark', 'stationRemark', 'unit', 'time', 'amount',
+    'booking_timestamp', 'completion_time', 'user_rating', 'distance_from_user', 'wait_time_actual',
+)
+
+
+class Echo:
+    """File-like object whose write() just returns the line for streaming"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, fields, filename, chunk_size=2000):
+    """CSV download that iterates the queryset in chunks instead of loading it"""
+    writer = csv.writer(Echo())
+
+    def rows():
+        yield writer.writerow(fields)
+        for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(rows(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def booking_export_queryset(station_id=None, status=None, date_from=None, date_to=None):
+    """Bookings to export, in (arrivalTime, id) order; date_to is inclusive"""
+    from datetime import timedelta
+
+    from EVStationMaster.models import SlotBooking
+
+    bookings = SlotBooking.objects.all()
+    if station_id is not None:
+        bookings = bookings.filter(stationId=station_id)
+    if status:
+        bookings = bookings.filter(status=status)
+    # Range on the raw column so the (stationId, status, arrivalTime) index applies
+    if date_from:
+        bookings = bookings.filter(arrivalTime__gte=date_from)
+    if date_to:
+        bookings = bookings.filter(arrivalTime__lt=date_to + timedelta(days=1))
+    return bookings.order_by('arrivalTime', 'id')
+
+
+def arrow_schema(model, fields):
+    """Arrow schema for model fields, so all-NULL batches still get the right column types"""
+    from django.conf import settings
+
+    timestamp = pa.timestamp('us', tz='UTC' if settings.USE_TZ else None)
+    types = {
+        'AutoField': pa.int64(), 'BigAutoField': pa.int64(), 'IntegerField': pa.int64(),
+        'BigIntegerField': pa.int64(), 'FloatField': pa.float64(), 'BooleanField': pa.bool_(),
+        'DateTimeField': timestamp, 'DateField': pa.date32(),
+    }
+    return pa.schema([
+        (name, types.get(model._meta.get_field(name).get_internal_type(), pa.string())) for name in fields
+    ])
+
+
+def _record_batches(queryset, fields, schema, batch_size):
+    """Arrow record batches of `batch_size` rows, read through a chunked iterator"""
+    rows = queryset.values_list(*fields).iterator(chunk_size=batch_size)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            return
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)], schema=schema
+        )
+
+
+class ByteSink(io.RawIOBase):
+    """Write-only stream that hands the written bytes back in pieces for streaming"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(queryset, fields, batch_size=50000):
+    """Parquet file bytes, one row group per batch; at most one batch is held in memory"""
+    if pq is None:
+        raise RuntimeError("pyarrow is required for Parquet export")
+    schema = arrow_schema(queryset.model, fields)
+    sink = ByteSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in _record_batches(queryset, fields, schema, batch_size):
+        writer.write_table(pa.Table.from_batches([batch]))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def write_parquet(queryset, fields, path, batch_size=50000):
+    with open(path, 'wb') as f:
+        for data in iter_parquet(queryset, fields, batch_size):
+            f.write(data)
+
+
+def stream_parquet(queryset, fields, filename, batch_size=50000):
+    """Parquet download streamed row group by row group"""
+    response = StreamingHttpResponse(iter_parquet(queryset, fields, batch_size),
+                                     content_type='application/vnd.apache.parquet')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,60 @@
+import numpy as np
+
+from EVStationMaster.features import STATION_FEATURE_FIELDS
+from EVStationMaster.refreshing_index import RefreshingIndex
+
+
+class StationFeatureStore(RefreshingIndex):
+    """Contiguous float32 matrix of static station features with a pk -> row index"""
+
+    data_attributes = ('matrix', 'rows')
+
+    def __init__(self, refresh_interval=300):
+        super().__init__(refresh_interval)
+        self.matrix = np.zeros((0, len(STATION_FEATURE_FIELDS)), dtype=np.float32)
+        self.rows = {}
+
+    def _load(self):
+        """A new store of all stations, read in one query"""
+        from EVStationMaster.models import StationDetails
+
+        rows = list(StationDetails.objects.values_list('pk', *STATION_FEATURE_FIELDS))
+        fresh = StationFeatureStore()
+        fresh.matrix = np.asarray([row[1:] for row in rows], dtype=np.float32).reshape(-1, len(STATION_FEATURE_FIELDS))
+        fresh.rows = {row[0]: i for i, row in enumerate(rows)}
+        return fresh
+
+    def _allocate_row(self):
+        row = len(self.rows)
+        if row >= len(self.matrix):
+            # Grow by doubling so appends stay amortized O(1)
+            grown = np.zeros((max(2 * len(self.matrix), 16), self.matrix.shape[1]), dtype=np.float32)
+            grown[:len(self.matrix)] = self.matrix
+            self.matrix = grown
+        return row
+
+    def _apply(self, station):
+        """Write a station's static features"""
+        row = self.rows.get(station.pk)
+        if row is None:
+            row = self._allocate_row()
+            self.rows[station.pk] = row
+        self.matrix[row] = [float(getattr(station, field) or 0) for field in STATION_FEATURE_FIELDS]
+
+    def refresh(self, station_id):
+        """Reload the rows of a stationId from the database"""
+        from EVStationMaster.models import StationDetails
+
+        for station in StationDetails.objects.filter(stationId=station_id):
+            self.update(station)
+
+    def get_rows(self, pks):
+        """Feature columns (float64) for the given pks, skipping unknown ones"""
+        self.ensure_built()
+        with self.lock:
+            found = [pk for pk in pks if pk in self.rows]
+            columns = self.matrix[[self.rows[pk] for pk in found]].astype(float)
+        return found, columns
+
+
+station_features = StationFeatureStore()
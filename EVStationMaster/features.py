@@ -0,0 +1,47 @@
+import numpy as np
+
+# Station columns needed to build the feature matrix, in feature order
+STATION_FEATURE_FIELDS = (
+    'stationId', 'rapidcharger', 'fastCharger', 'slowcharger', 'Pspaces',
+    'average_rating', 'total_bookings', 'amenities_score', 'latitude', 'longitude'
+)
+
+# Columns of the feature matrix, saved with each model as its schema
+FEATURE_NAMES = (
+    'rapidcharger', 'fastCharger', 'slowcharger', 'Pspaces', 'average_rating',
+    'total_bookings', 'amenities_score', 'occupancy_rate', 'distance_km',
+    'hour', 'day_of_week', 'is_weekend', 'is_peak_hour', 'charger_pref'
+)
+
+PEAK_HOURS = [9, 10, 11, 18, 19, 20]
+
+
+def station_columns(rows):
+    """N x len(STATION_FEATURE_FIELDS) float array from values_list rows"""
+    return np.asarray(rows, dtype=float).reshape(-1, len(STATION_FEATURE_FIELDS))
+
+
+def build_feature_matrix(columns, counts, distance, hours, weekdays, charger_pref, peak=None):
+    """Assemble the N x 14 feature matrix; every argument after columns is per row
+
+    peak gives per-row peak-hour flags (e.g. from the demand forecast); without it
+    the static PEAK_HOURS are used.
+    """
+    station_ids, rapid, fast, slow, spaces, rating, bookings, amenities, lat, lng = columns.T
+    n = len(columns)
+
+    capacity = rapid + fast + slow
+    occupancy_rate = np.divide(counts, capacity, out=np.zeros(n), where=capacity != 0) * 100
+
+    hours = np.asarray(hours, dtype=float)
+    weekdays = np.asarray(weekdays, dtype=float)
+    is_weekend = (weekdays >= 5).astype(float)
+    if peak is None:
+        is_peak_hour = np.isin(hours, PEAK_HOURS).astype(float)
+    else:
+        is_peak_hour = np.asarray(peak, dtype=float)
+
+    return np.column_stack([
+        rapid, fast, slow, spaces, rating, bookings, amenities, occupancy_rate, distance,
+        hours, weekdays, is_weekend, is_peak_hour, np.broadcast_to(charger_pref, (n,))
+    ]).astype(float)
@@ -0,0 +1,328 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from EVStationMaster.features import PEAK_HOURS
+from EVStationMaster.model_store import model_root
+
+HOURS_PER_WEEK = 168
+FORECAST_FILE = 'demand_forecast.npz'
+
+# Every booking request is demand, whatever the station decided
+DEMAND_STATUSES = ('Accept', 'Reject', 'Request Pending', 'Pending')
+
+# Hours at or above this multiple of a station's mean hourly demand count as peak
+PEAK_RATIO = 1.5
+
+
+def week_start(when):
+    """Monday 00:00 of the week containing `when` (naive local time)"""
+    day = when.date() - timedelta(days=when.weekday())
+    return datetime.combine(day, datetime.min.time())
+
+
+def hours_of_week(weekdays, hours):
+    return np.asarray(weekdays, dtype=int) * 24 + np.asarray(hours, dtype=int)
+
+
+def _aware(value):
+    return timezone.make_aware(value) if settings.USE_TZ and timezone.is_naive(value) else value
+
+
+def lookup(sorted_ids, ids):
+    """(positions, found) of ids in a sorted id array"""
+    ids = np.asarray(ids, dtype=np.int64)
+    positions = np.searchsorted(sorted_ids, ids)
+    found = positions < len(sorted_ids)
+    found[found] = sorted_ids[positions[found]] == ids[found]
+    return positions, found
+
+
+def weekly_counts(station_ids, start, chunk_size=50000):
+    """len(station_ids) x 168 booking counts for the week starting at `start`"""
+    from EVStationMaster.models import SlotBooking
+
+    station_ids = np.asarray(station_ids, dtype=np.int64)
+    counts = np.zeros((len(station_ids), HOURS_PER_WEEK), dtype=np.float32)
+    if len(station_ids) == 0:
+        return counts
+
+    # Station-id range plus status list keeps this on the (stationId, status, arrivalTime) index
+    rows = SlotBooking.objects.filter(
+        stationId__gte=int(station_ids[0]), stationId__lte=int(station_ids[-1]),
+        status__in=DEMAND_STATUSES,
+        arrivalTime__gte=_aware(start), arrivalTime__lt=_aware(start + timedelta(days=7)),
+    ).values_list('stationId', 'arrivalTime').iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return counts
+        frame = pd.DataFrame(chunk, columns=['stationId', 'arrivalTime'])
+        arrivals = pd.to_datetime(frame['arrivalTime'])
+        if arrivals.dt.tz is not None:
+            arrivals = arrivals.dt.tz_convert(timezone.get_current_timezone()).dt.tz_localize(None)
+        slots = hours_of_week(arrivals.dt.weekday, arrivals.dt.hour)
+        station_rows, known = lookup(station_ids, frame['stationId'].to_numpy())
+        np.add.at(counts, (station_rows[known], slots[known]), 1)
+
+
+def fit_shard(station_ids, profiles, weeks_seen, week_starts, alpha):
+    """Seasonal exponential smoothing over hour-of-week for one shard of stations
+
+    Each complete week moves a station's 168-slot profile towards that week's counts;
+    a station's first week initialises its profile. Runs in a pool process.
+    """
+    profiles = profiles.copy()
+    weeks_seen = weeks_seen.copy()
+    for start in week_starts:
+        counts = weekly_counts(station_ids, start)
+        first = weeks_seen == 0
+        profiles[first] = counts[first]
+        profiles[~first] = alpha * counts[~first] + (1 - alpha) * profiles[~first]
+        weeks_seen += 1
+    return profiles, weeks_seen
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def peak_hour_mask(profiles, weeks_seen):
+    """N x 24 peak-hour flags from the daily average of each weekly profile"""
+    daily = profiles.reshape(-1, 7, 24).mean(axis=1)
+    mean = daily.mean(axis=1, keepdims=True)
+    mask = (daily >= PEAK_RATIO * mean) & (daily > 0)
+    mask[weeks_seen == 0] = False
+    return mask
+
+
+def format_hour_ranges(hours):
+    """[9, 10, 11, 18, 19, 20] -> '9-11,18-20'"""
+    ranges = []
+    for hour in sorted(hours):
+        if ranges and hour == ranges[-1][1] + 1:
+            ranges[-1][1] = hour
+        else:
+            ranges.append([hour, hour])
+    return ','.join(str(a) if a == b else f'{a}-{b}' for a, b in ranges)
+
+
+class DemandForecaster:
+    """Fits per-station hour-of-week demand profiles and publishes them as one array file"""
+
+    def __init__(self, root=None, alpha=0.3, history_weeks=8, workers=None, shard_size=5000):
+        self.root = root or model_root()
+        self.alpha = alpha
+        self.history_weeks = history_weeks  # weeks used by a full fit
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 1) - 1))
+        self.shard_size = shard_size
+
+    @property
+    def path(self):
+        return os.path.join(self.root, FORECAST_FILE)
+
+    def load_state(self):
+        try:
+            with np.load(self.path) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+
+    def fit(self, full=False, now=None):
+        """Fold complete weeks since the last fit into the profiles; returns weeks processed"""
+        from EVStationMaster.models import StationDetails
+
+        current_week = week_start(now or datetime.now())
+        state = None if full else self.load_state()
+
+        station_ids = np.array(sorted(StationDetails.objects.values_list('stationId', flat=True).distinct()),
+                               dtype=np.int64)
+        profiles = np.zeros((len(station_ids), HOURS_PER_WEEK), dtype=np.float32)
+        weeks_seen = np.zeros(len(station_ids), dtype=np.int32)
+
+        if state is None:
+            start = current_week - timedelta(weeks=self.history_weeks)
+        else:
+            # Carry over stations already fitted; new stations start empty
+            start = datetime.fromisoformat(str(state['through']))
+            previous, found = lookup(state['stations'], station_ids)
+            profiles[found] = state['profiles'][previous[found]]
+            weeks_seen[found] = state['weeks_seen'][previous[found]]
+
+        week_starts = []
+        while start + timedelta(days=7) <= current_week:
+            week_starts.append(start)
+            start += timedelta(days=7)
+        if not week_starts and state is not None and len(state['stations']) == len(station_ids):
+            return 0
+
+        shards = [slice(i, i + self.shard_size) for i in range(0, len(station_ids), self.shard_size)]
+        if self.workers > 1 and len(shards) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(shards)),
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker) as pool:
+                futures = [
+                    pool.submit(fit_shard, station_ids[s], profiles[s], weeks_seen[s], week_starts, self.alpha)
+                    for s in shards
+                ]
+                for s, future in zip(shards, futures):
+                    profiles[s], weeks_seen[s] = future.result()
+        else:
+            for s in shards:
+                profiles[s], weeks_seen[s] = fit_shard(
+                    station_ids[s], profiles[s], weeks_seen[s], week_starts, self.alpha
+                )
+
+        self.publish(station_ids, profiles, weeks_seen, start)
+        self.update_peak_hours(station_ids, profiles, weeks_seen)
+        return len(week_starts)
+
+    def publish(self, station_ids, profiles, weeks_seen, through):
+        """Atomically replace the forecast file read by every worker"""
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.forecast-', suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, stations=station_ids, profiles=profiles.astype(np.float32),
+                     weeks_seen=weeks_seen, through=np.array(through.isoformat()))
+        os.replace(tmp_path, self.path)
+
+    def update_peak_hours(self, station_ids, profiles, weeks_seen, batch_size=1000):
+        """Write the forecast peak hours to StationDetails.peak_hours, one UPDATE per distinct value"""
+        from EVStationMaster.models import StationDetails
+
+        groups = {}
+        for station_id, hours, seen in zip(station_ids, peak_hour_mask(profiles, weeks_seen), weeks_seen):
+            if seen and hours.any():
+                groups.setdefault(format_hour_ranges(np.flatnonzero(hours)), []).append(int(station_id))
+        for value, ids in groups.items():
+            for i in range(0, len(ids), batch_size):
+                StationDetails.objects.filter(stationId__in=ids[i:i + batch_size]).exclude(
+                    peak_hours=value
+                ).update(peak_hours=value)
+
+
+class DemandForecast:
+    """Per-process reader of the published forecast, reloaded when the file changes"""
+
+    def __init__(self, root=None, check_interval=30):
+        self.root = root or model_root()
+        self.check_interval = check_interval  # seconds between file checks
+        self.checked_at = 0
+        self.mtime = None
+        self.stations = None
+        self.profiles = None
+        self.daily = None  # N x 24 mean demand per hour of day
+        self.thresholds = None
+        self.lock = threading.Lock()
+
+    def _refresh(self):
+        if time.monotonic() - self.checked_at < self.check_interval:
+            return
+        with self.lock:
+            self.checked_at = time.monotonic()
+            path = os.path.join(self.root, FORECAST_FILE)
+            try:
+                mtime = os.path.getmtime(path)
+                if mtime == self.mtime:
+                    return
+                with np.load(path) as data:
+                    stations, profiles, weeks_seen = data['stations'], data['profiles'], data['weeks_seen']
+            except (OSError, ValueError, KeyError):
+                return
+            daily = profiles.reshape(-1, 7, 24).mean(axis=1)
+            thresholds = PEAK_RATIO * daily.mean(axis=1)  # same rule as peak_hour_mask
+            thresholds[weeks_seen == 0] = np.inf  # no history: fall back to PEAK_HOURS
+            self.stations, self.profiles, self.daily = stations, profiles, daily
+            self.thresholds, self.mtime = thresholds, mtime
+
+    def demand(self, station_ids, slots):
+        """Forecast bookings per station at the given hour-of-week slots (0 where unknown)"""
+        self._refresh()
+        result = np.zeros(len(station_ids), dtype=float)
+        if self.stations is None or len(station_ids) == 0:
+            return result
+        rows, found = lookup(self.stations, station_ids)
+        slots = np.broadcast_to(np.asarray(slots, dtype=int), result.shape)
+        result[found] = self.profiles[rows[found], slots[found]]
+        return result
+
+    def is_peak(self, station_ids, hours):
+        """Per-station peak-hour flags; stations without a forecast use the static PEAK_HOURS"""
+        self._refresh()
+        n = len(station_ids)
+        hours = np.broadcast_to(np.asarray(hours, dtype=int), (n,))
+        peak = np.isin(hours, PEAK_HOURS).astype(float)
+        if self.stations is None or n == 0:
+            return peak
+        rows, fitted = lookup(self.stations, station_ids)
+        fitted[fitted] = np.isfinite(self.thresholds[rows[fitted]])
+        demand = self.daily[rows[fitted], hours[fitted]]
+        peak[fitted] = ((demand >= self.thresholds[rows[fitted]]) & (demand > 0)).astype(float)
+        return peak
+
+
+class PeakHistory:
+    """Peak-hour flags as the forecast stood before each booking, for training without look-ahead
+
+    Replays the forecaster's weekly smoothing forward in time, starting history_weeks
+    before the first booking like a full fit. Each booking's flags come only from the
+    complete weeks before its own, with the same rule and PEAK_HOURS fallback as
+    DemandForecast.is_peak. Arrivals must be passed in non-decreasing order.
+    """
+
+    def __init__(self, alpha=0.3, history_weeks=8):
+        self.alpha = alpha
+        self.history_weeks = history_weeks
+        self.stations = None
+        self.profiles = None
+        self.weeks_seen = None
+        self.week = None  # first week not yet folded in
+
+    def _advance(self, week):
+        from EVStationMaster.models import StationDetails
+
+        if self.week is None:
+            self.stations = np.array(
+                sorted(StationDetails.objects.values_list('stationId', flat=True).distinct()), dtype=np.int64)
+            self.profiles = np.zeros((len(self.stations), HOURS_PER_WEEK), dtype=np.float32)
+            self.weeks_seen = np.zeros(len(self.stations), dtype=np.int32)
+            self.week = week - timedelta(weeks=self.history_weeks)
+        if week + timedelta(days=7) <= self.week:
+            raise ValueError("PeakHistory needs arrivals in time order")
+        week_starts = []
+        while self.week < week:
+            week_starts.append(self.week)
+            self.week += timedelta(days=7)
+        if week_starts and len(self.stations):
+            self.profiles, self.weeks_seen = fit_shard(
+                self.stations, self.profiles, self.weeks_seen, week_starts, self.alpha)
+
+    def is_peak(self, station_ids, arrivals):
+        """Per-booking peak-hour flags for (naive local) arrival times"""
+        station_ids = np.asarray(station_ids, dtype=np.int64)
+        hours = np.array([arrival.hour for arrival in arrivals], dtype=int)
+        weeks = np.array([week_start(arrival) for arrival in arrivals])
+        peak = np.isin(hours, PEAK_HOURS).astype(float)
+        for week in sorted(set(weeks)):
+            self._advance(week)
+            in_week = np.flatnonzero(weeks == week)
+            rows, fitted = lookup(self.stations, station_ids[in_week])
+            fitted[fitted] = self.weeks_seen[rows[fitted]] > 0
+            mask = peak_hour_mask(self.profiles[rows[fitted]], self.weeks_seen[rows[fitted]])
+            peak[in_week[fitted]] = mask[np.arange(len(mask)), hours[in_week[fitted]]]
+        return peak
+
+
+demand_forecast = DemandForecast()
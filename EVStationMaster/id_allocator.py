@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models import Max
+
+STATION_ID_COUNTER = 'stationId'
+
+
+def _locked_station_counter():
+    """The stationId counter row, locked until the surrounding transaction commits"""
+    from EVStationMaster.models import IdCounter, StationDetails
+
+    counter = IdCounter.objects.select_for_update().filter(name=STATION_ID_COUNTER).first()
+    if counter is None:
+        # First use without the seeding migration: start after the current maximum
+        current = StationDetails.objects.aggregate(last=Max('stationId'))['last'] or 0
+        counter, _ = IdCounter.objects.get_or_create(name=STATION_ID_COUNTER, defaults={'value': current})
+        counter = IdCounter.objects.select_for_update().get(pk=counter.pk)
+    return counter
+
+
+def allocate_station_ids(count=1):
+    """Reserve `count` consecutive stationIds; safe under concurrent registrations"""
+    with transaction.atomic():
+        # The locked counter row serializes allocators until this transaction commits
+        counter = _locked_station_counter()
+        first = counter.value + 1
+        counter.value += count
+        counter.save(update_fields=['value'])
+    return list(range(first, first + count))
+
+
+def reserve_station_ids_through(station_id):
+    """Move the counter past an explicitly supplied stationId (e.g. from an import)"""
+    with transaction.atomic():
+        counter = _locked_station_counter()
+        if station_id > counter.value:
+            counter.value = station_id
+            counter.save(update_fields=['value'])
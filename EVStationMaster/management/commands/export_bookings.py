@@ -0,0 +1,54 @@
+import csv
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from EVStationMaster.exports import BOOKING_EXPORT_FIELDS, booking_export_queryset, pq, write_parquet
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Export bookings as CSV or Parquet without loading them into memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--station', type=int, help="stationId to export")
+        parser.add_argument('--status', help="e.g. Accept, Reject, Request Pending")
+        parser.add_argument('--from', dest='date_from', type=parse_date, help="first day, YYYY-MM-DD")
+        parser.add_argument('--to', dest='date_to', type=parse_date, help="last day (inclusive), YYYY-MM-DD")
+        parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+        parser.add_argument('--output', '-o', help="file to write; CSV goes to stdout when omitted")
+        parser.add_argument('--chunk-size', type=int, help="rows per fetch (CSV) or row group (Parquet)")
+
+    def handle(self, *args, **options):
+        bookings = booking_export_queryset(
+            station_id=options['station'],
+            status=options['status'],
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+        )
+        fields = BOOKING_EXPORT_FIELDS
+
+        if options['format'] == 'parquet':
+            if pq is None:
+                raise CommandError("Parquet export needs pyarrow installed")
+            if not options['output']:
+                raise CommandError("--output is required for Parquet")
+            write_parquet(bookings, fields, options['output'], batch_size=options['chunk_size'] or 50000)
+            return
+
+        out = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            writer = csv.writer(out)
+            writer.writerow(fields)
+            for row in bookings.values_list(*fields).iterator(chunk_size=options['chunk_size'] or 5000):
+                writer.writerow(row)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from EVStationMaster.forecasting import DemandForecaster
+
+
+class Command(BaseCommand):
+    help = "Fold completed weeks of bookings into the per-station hourly demand forecast"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="refit from --history-weeks instead of the last fit")
+        parser.add_argument('--history-weeks', type=int, default=8)
+        parser.add_argument('--workers', type=int, help="processes fitting station shards in parallel")
+        parser.add_argument('--shard-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        forecaster = DemandForecaster(
+            history_weeks=options['history_weeks'],
+            workers=options['workers'],
+            shard_size=options['shard_size'],
+        )
+        weeks = forecaster.fit(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"Forecast updated with {weeks} new week(s) at {forecaster.path}"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from EVStationMaster.station_import import import_stations, iter_csv, iter_json
+
+
+class Command(BaseCommand):
+    help = "Bulk-import stations from a CSV or JSON (array or JSON Lines) file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'json'], help="defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--no-update', action='store_true', help="skip rows whose stationId already exists")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('json' if path.lower().endswith(('.json', '.jsonl')) else 'csv')
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as textfile:
+                rows = iter_json(textfile) if fmt == 'json' else iter_csv(textfile)
+                result = import_stations(rows, batch_size=options['batch_size'],
+                                         update_existing=not options['no_update'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Error importing {path}: {e}")
+
+        for error in result.errors:
+            self.stderr.write(f"row {error['row']}: {', '.join(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"created {result.created}, updated {result.updated}, failed {result.failed}"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from EVStationMaster.station_stats import recompute_station_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild every station's average_rating and total_bookings from the bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = recompute_station_stats(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Updated statistics for {changed} stations"))
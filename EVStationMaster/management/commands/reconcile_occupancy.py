@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from EVStationMaster.occupancy import reconcile_counters
+
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Rebuild the live occupancy counters from the accepted bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=parse_day, help="first day, YYYY-MM-DD")
+        parser.add_argument('--to', dest='date_to', type=parse_day, help="last day (inclusive), YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        written = reconcile_counters(options['date_from'], options['date_to'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} occupancy counters"))
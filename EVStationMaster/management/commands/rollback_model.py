@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from EVStationMaster.model_store import ModelArtifactStore
+
+
+class Command(BaseCommand):
+    help = "Point the live recommendation model at an older stored version"
+
+    def add_arguments(self, parser):
+        parser.add_argument('version', nargs='?', help="version to make current (default: the one before it)")
+        parser.add_argument('--list', action='store_true', help="list stored versions and exit")
+
+    def handle(self, *args, **options):
+        store = ModelArtifactStore()
+        current = store.current_version()
+        if options['list']:
+            for version in store.list_versions():
+                self.stdout.write(f"{'*' if version == current else ' '} {version}")
+            return
+
+        try:
+            version = store.rollback(options['version'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if version is None:
+            raise CommandError(f"No version older than {current} to roll back to")
+        # Workers' registries poll CURRENT and load the version within seconds
+        self.stdout.write(self.style.SUCCESS(f"Current model is now {version} (was {current})"))
@@ -0,0 +1,126 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+try:
+    from django.contrib.postgres.operations import TrigramExtension
+except ImportError:  # no PostgreSQL driver installed: other backends use the in-process index
+    TrigramExtension = None
+
+TABLE = '"EVStationMaster_stationdetails"'
+
+# Must match the expression built by EVStationMaster.search.SearchDocument
+INDEXES = {
+    'stationdetails_name_trgm': 'lower("stationName")',
+    'stationdetails_area_trgm': (
+        'lower("city" || \' | \' || "Area" || \' | \' || "loc1" || \' | \' || "loc2" || \' | \' || '
+        '"loc3" || \' | \' || "loc4" || \' | \' || "loc5" || \' | \' || "loc6")'
+    ),
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Only PostgreSQL has pg_trgm; other backends use the in-process index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, expression in INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {TABLE} USING gin (({expression}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EVStationMaster', '0010_auto_20231125_1314'),
+    ]
+
+    # The recommendation fields the models gained without a migration; the later
+    # migrations in this series read and index them
+    operations = [
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customerName', models.CharField(max_length=255, unique=True)),
+                ('email', models.EmailField(max_length=254)),
+                ('mobile', models.CharField(max_length=10)),
+                ('preferred_charger_type', models.CharField(default='fast', max_length=50)),
+                ('home_latitude', models.FloatField(default=0.0)),
+                ('home_longitude', models.FloatField(default=0.0)),
+                ('vehicle_type', models.CharField(default='sedan', max_length=100)),
+                ('battery_capacity', models.IntegerField(default=50)),
+                ('charging_frequency', models.CharField(default='weekly', max_length=20)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='slotbooking',
+            name='booking_timestamp',
+            field=models.DateTimeField(auto_now_add=True, default=timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='slotbooking',
+            name='completion_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='slotbooking',
+            name='distance_from_user',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='slotbooking',
+            name='user_rating',
+            field=models.IntegerField(choices=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)], default=0),
+        ),
+        migrations.AddField(
+            model_name='slotbooking',
+            name='wait_time_actual',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='stationdetails',
+            name='amenities_score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='stationdetails',
+            name='average_rating',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='stationdetails',
+            name='latitude',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='stationdetails',
+            name='longitude',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='stationdetails',
+            name='peak_hours',
+            field=models.CharField(default='9-11,18-20', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='stationdetails',
+            name='total_bookings',
+            field=models.IntegerField(default=0),
+        ),
+    ]
+
+    # TrigramExtension is a no-op when pg_trgm is already installed. Installing it needs
+    # superuser before PostgreSQL 13; from 13 on pg_trgm is a trusted extension, so the
+    # CREATE privilege on the database is enough. Without either, have a DBA run
+    # CREATE EXTENSION pg_trgm; before migrating.
+    operations += ([TrigramExtension()] if TrigramExtension else []) + [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
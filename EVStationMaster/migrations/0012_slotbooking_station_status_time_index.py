@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EVStationMaster', '0011_station_search_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='slotbooking',
+            index=models.Index(fields=['stationId', 'status', 'arrivalTime'], name='booking_station_status_time'),
+        ),
+    ]
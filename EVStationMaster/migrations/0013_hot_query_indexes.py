@@ -0,0 +1,58 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_unique_station_ids(apps, schema_editor):
+    """Abort before stationId becomes unique if existing rows share one
+
+    Duplicates are not renumbered here: SlotBooking rows refer to stations by stationId,
+    so which station a shared id's bookings belong to has to be decided by hand.
+    """
+    StationDetails = apps.get_model('EVStationMaster', 'StationDetails')
+    duplicates = (
+        StationDetails.objects.values('stationId').annotate(rows=Count('id')).filter(rows__gt=1).order_by('stationId')
+    )
+    if not duplicates:
+        return
+    lines = [
+        f"  stationId {row['stationId']}: pks "
+        + ', '.join(str(pk) for pk in StationDetails.objects.filter(stationId=row['stationId']).values_list('pk', flat=True))
+        for row in duplicates
+    ]
+    raise RuntimeError(
+        "Cannot make StationDetails.stationId unique; these ids are shared by several stations:\n"
+        + '\n'.join(lines)
+        + "\nGive each station its own stationId (and move its SlotBooking rows with it), then re-run migrate."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EVStationMaster', '0012_slotbooking_station_status_time_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_unique_station_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stationdetails',
+            name='stationId',
+            field=models.IntegerField(unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='stationdetails',
+            index=models.Index(fields=['username', 'password', 'status'], name='station_login'),
+        ),
+        migrations.AddIndex(
+            model_name='stationdetails',
+            index=models.Index(fields=['status'], name='station_status'),
+        ),
+        migrations.AddIndex(
+            model_name='slotbooking',
+            index=models.Index(fields=['status', 'arrivalTime'], name='booking_status_time'),
+        ),
+        migrations.AddIndex(
+            model_name='slotbooking',
+            index=models.Index(fields=['customerName', 'vehicleRegistration'], name='booking_customer_vehicle'),
+        ),
+    ]
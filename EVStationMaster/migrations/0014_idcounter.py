@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_station_counter(apps, schema_editor):
+    IdCounter = apps.get_model('EVStationMaster', 'IdCounter')
+    StationDetails = apps.get_model('EVStationMaster', 'StationDetails')
+    current = StationDetails.objects.aggregate(last=Max('stationId'))['last'] or 0
+    IdCounter.objects.update_or_create(name='stationId', defaults={'value': current})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EVStationMaster', '0013_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_station_counter, migrations.RunPython.noop),
+    ]
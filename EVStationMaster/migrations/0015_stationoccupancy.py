@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def seed_occupancy_counters(apps, schema_editor):
+    SlotBooking = apps.get_model('EVStationMaster', 'SlotBooking')
+    StationOccupancy = apps.get_model('EVStationMaster', 'StationOccupancy')
+    rows = SlotBooking.objects.filter(status='Accept').annotate(
+        day=TruncDate('arrivalTime')
+    ).values('stationId', 'day', 'chargerType').annotate(total=Count('id'))
+    StationOccupancy.objects.bulk_create([
+        StationOccupancy(stationId=row['stationId'], day=row['day'], chargerType=row['chargerType'], accepted=row['total'])
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EVStationMaster', '0014_idcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StationOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stationId', models.IntegerField()),
+                ('day', models.DateField()),
+                ('chargerType', models.CharField(max_length=255)),
+                ('accepted', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stationoccupancy',
+            constraint=models.UniqueConstraint(fields=('stationId', 'day', 'chargerType'), name='occupancy_station_day_type'),
+        ),
+        migrations.RunPython(seed_occupancy_counters, migrations.RunPython.noop),
+    ]
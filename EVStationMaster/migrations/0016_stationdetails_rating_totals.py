@@ -0,0 +1,39 @@
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+
+def seed_rating_totals(apps, schema_editor):
+    """Start the running totals from the ratings already on the bookings"""
+    SlotBooking = apps.get_model('EVStationMaster', 'SlotBooking')
+    StationDetails = apps.get_model('EVStationMaster', 'StationDetails')
+
+    rated = SlotBooking.objects.filter(stationId=OuterRef('stationId'), user_rating__gt=0).order_by().values('stationId')
+    StationDetails.objects.update(
+        rating_sum=Coalesce(Subquery(rated.annotate(total=Sum('user_rating')).values('total')), 0),
+        rating_count=Coalesce(Subquery(rated.annotate(total=Count('id')).values('total')), 0),
+    )
+    StationDetails.objects.filter(rating_count__gt=0).update(
+        average_rating=Cast(F('rating_sum'), FloatField()) / F('rating_count')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EVStationMaster', '0015_stationoccupancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stationdetails',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='stationdetails',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(seed_rating_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EVStationMaster', '0016_stationdetails_rating_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slotbooking',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='slotbooking',
+            index=models.Index(fields=['status', 'updated_at'], name='booking_status_updated'),
+        ),
+    ]
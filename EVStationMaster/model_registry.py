@@ -0,0 +1,70 @@
+import threading
+import time
+
+
+class ModelSnapshot:
+    """An immutable model/scaler pair loaded from one artifact version"""
+
+    def __init__(self, model, scaler, version, feature_schema=None, metadata=None, wait_model=None):
+        self.model = model
+        self.scaler = scaler
+        self.version = version
+        self.feature_schema = feature_schema
+        self.metadata = metadata or {}
+        self.wait_model = wait_model  # None: wait times come from the queueing estimate
+
+
+class ModelRegistry:
+    """Per-process holder of the current model that hot-reloads on version change"""
+
+    def __init__(self, store, check_interval=5):
+        self.store = store
+        self.check_interval = check_interval  # seconds between version checks
+        self.snapshot = None
+        self.checked_at = 0
+        self.load_lock = threading.Lock()
+
+    def _load(self, version):
+        bundle = self.store.load(version)
+        return ModelSnapshot(
+            bundle['model'], bundle['scaler'], version,
+            bundle.get('feature_schema'), bundle.get('metadata'), bundle.get('wait_model')
+        )
+
+    def reload(self, force=False):
+        """Load the current version if it changed; readers keep the old snapshot meanwhile"""
+        # Only one thread loads; the others carry on with the current snapshot
+        if not self.load_lock.acquire(blocking=force):
+            return self.snapshot
+        try:
+            self.checked_at = time.monotonic()
+            version = self.store.current_version()
+            if version is None:
+                return self.snapshot
+            if force or self.snapshot is None or self.snapshot.version != version:
+                self.snapshot = self._load(version)
+        except Exception as e:
+            print(f"Error loading model: {e}")
+        finally:
+            self.load_lock.release()
+        return self.snapshot
+
+    def get(self):
+        """Current snapshot, checking the store at most every check_interval seconds"""
+        if time.monotonic() - self.checked_at >= self.check_interval:
+            return self.reload()
+        return self.snapshot
+
+    def publish(self, model, scaler, feature_schema=None, metadata=None, wait_model=None):
+        """Save a freshly trained model to the store and swap it in"""
+        version = self.store.save(model, scaler, feature_schema or [], metadata, wait_model)
+        self.snapshot = ModelSnapshot(model, scaler, version, feature_schema, metadata, wait_model)
+        self.checked_at = time.monotonic()
+        return version
+
+    def rollback(self, version=None):
+        """Make an older stored version current and load it"""
+        version = self.store.rollback(version)
+        if version is not None:
+            self.reload(force=True)
+        return version
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import joblib
+
+BUNDLE_FILE = 'bundle.joblib'
+CURRENT_FILE = 'CURRENT'
+
+
+def model_root():
+    """settings.ML_MODELS_ROOT, else ml_models under settings.BASE_DIR, independent of the working directory"""
+    from django.conf import settings
+
+    root = getattr(settings, 'ML_MODELS_ROOT', None)
+    if root:
+        return str(root)
+    return os.path.join(str(getattr(settings, 'BASE_DIR', os.getcwd())), 'ml_models')
+
+
+class ModelArtifactStore:
+    """Versioned on-disk store of model bundles with atomic publish and rollback"""
+
+    def __init__(self, root=None, keep=5):
+        self.root = root or model_root()
+        self.keep = keep  # number of versions retained on disk
+
+    def _version_dir(self, version):
+        return os.path.join(self.root, version)
+
+    def _write_current(self, version):
+        # Temp file + rename so readers never see a half-written pointer
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.current-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.root, CURRENT_FILE))
+
+    def list_versions(self):
+        """Saved versions, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith('.') and os.path.isfile(os.path.join(self.root, name, BUNDLE_FILE))
+        )
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def save(self, model, scaler, feature_schema, metadata=None, wait_model=None):
+        """Write model, scaler, schema, metadata and wait model as one bundle and make it current"""
+        os.makedirs(self.root, exist_ok=True)
+        version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        bundle = {
+            'model': model,
+            'scaler': scaler,
+            'feature_schema': list(feature_schema),
+            'metadata': dict(metadata or {}, version=version),
+            'wait_model': wait_model,
+        }
+
+        tmp_dir = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+        try:
+            joblib.dump(bundle, os.path.join(tmp_dir, BUNDLE_FILE))
+            os.rename(tmp_dir, self._version_dir(version))
+        except:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self._write_current(version)
+        self.prune()
+        return version
+
+    def load(self, version=None):
+        """Load a bundle, the current version by default"""
+        version = version or self.current_version()
+        if version is None:
+            return None
+        bundle = joblib.load(os.path.join(self._version_dir(version), BUNDLE_FILE))
+        bundle['version'] = version
+        return bundle
+
+    def rollback(self, version=None):
+        """Point CURRENT at the given version, or the one before the current"""
+        versions = self.list_versions()
+        if version is None:
+            current = self.current_version()
+            older = [v for v in versions if current is None or v < current]
+            if not older:
+                return None
+            version = older[-1]
+        elif version not in versions:
+            raise ValueError(f"Unknown model version: {version}")
+        self._write_current(version)
+        return version
+
+    def prune(self):
+        """Delete the oldest versions beyond `keep`, never the current one"""
+        current = self.current_version()
+        versions = self.list_versions()
+        for version in versions[:max(0, len(versions) - self.keep)]:
+            if version != current:
+                shutil.rmtree(self._version_dir(version), ignore_errors=True)
@@ -0,0 +1,131 @@
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def today():
+    return timezone.localdate() if settings.USE_TZ else date.today()
+
+
+def day_bounds(day):
+    """[start, end) datetimes of a day, so filters can range-scan arrivalTime"""
+    start = datetime.combine(day, time.min)
+    end = start + timedelta(days=1)
+    if not settings.USE_TZ:
+        return start, end
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+def day_of(when):
+    """Local calendar day of a booking time, matching day_bounds"""
+    if settings.USE_TZ and timezone.is_aware(when):
+        return timezone.localtime(when).date()
+    return when.date()
+
+
+def booking_time(when):
+    """A request datetime made comparable with stored arrivalTime values (aware under USE_TZ)"""
+    if settings.USE_TZ:
+        return timezone.make_aware(when) if timezone.is_naive(when) else when
+    return timezone.make_naive(when) if timezone.is_aware(when) else when
+
+
+def count_accepted_bookings(station_ids=None, day=None):
+    """Ground truth: count accepted bookings per station for a day in one grouped query"""
+    from EVStationMaster.models import SlotBooking
+
+    if day is None:
+        day = today()
+
+    start, end = day_bounds(day)
+    bookings = SlotBooking.objects.filter(status='Accept', arrivalTime__gte=start, arrivalTime__lt=end)
+    if station_ids is not None:
+        bookings = bookings.filter(stationId__in=list(station_ids))
+
+    rows = bookings.values('stationId').annotate(total=Count('id')).values_list('stationId', 'total')
+    return dict(rows)
+
+
+def get_accepted_counts(station_ids=None, day=None, charger_type=None):
+    """Accepted bookings per station for a day, read from the live counters"""
+    from EVStationMaster.models import StationOccupancy
+
+    counters = StationOccupancy.objects.filter(day=day or today(), accepted__gt=0)
+    if station_ids is not None:
+        counters = counters.filter(stationId__in=list(station_ids))
+    if charger_type is not None:
+        counters = counters.filter(chargerType=charger_type)
+
+    rows = counters.values('stationId').annotate(total=Sum('accepted')).values_list('stationId', 'total')
+    return dict(rows)
+
+
+def apply_status_change(booking, old_status, new_status):
+    """Move the live counter for a booking's status transition; call inside the write's transaction"""
+    from EVStationMaster.models import StationOccupancy
+
+    delta = (new_status == 'Accept') - (old_status == 'Accept')
+    if delta == 0:
+        return
+    key = {'stationId': booking.stationId, 'day': day_of(booking.arrivalTime), 'chargerType': booking.chargerType}
+    # Insert-if-missing instead of get_or_create: concurrent first accepts of the day would
+    # otherwise race on the unique key, and the loser's retried get() can miss the winner's
+    # row (MySQL REPEATABLE READ); ON CONFLICT DO NOTHING / INSERT IGNORE waits for it instead
+    StationOccupancy.objects.bulk_create([StationOccupancy(accepted=0, **key)], ignore_conflicts=True)
+    # F() keeps concurrent transitions on the same counter from losing updates
+    StationOccupancy.objects.filter(**key).update(accepted=F('accepted') + delta)
+
+
+def reconcile_counters(date_from=None, date_to=None):
+    """Rebuild the counters for [date_from, date_to] (all days when omitted) from the bookings
+
+    Status changes move a counter while holding their station's row lock, so the rebuild
+    locks every station first: changes already in flight commit before it counts, and
+    new ones wait until the rebuilt counters are committed.
+    """
+    from EVStationMaster.models import SlotBooking, StationDetails, StationOccupancy
+
+    bookings = SlotBooking.objects.filter(status='Accept')
+    counters = StationOccupancy.objects.all()
+    if date_from:
+        bookings = bookings.filter(arrivalTime__gte=day_bounds(date_from)[0])
+        counters = counters.filter(day__gte=date_from)
+    if date_to:
+        bookings = bookings.filter(arrivalTime__lt=day_bounds(date_to)[1])
+        counters = counters.filter(day__lte=date_to)
+
+    rows = bookings.annotate(day=TruncDate('arrivalTime')).values(
+        'stationId', 'day', 'chargerType'
+    ).annotate(total=Count('id'))
+
+    with transaction.atomic():
+        list(StationDetails.objects.select_for_update().order_by('pk').values_list('pk', flat=True))
+        counters.delete()
+        created = StationOccupancy.objects.bulk_create([
+            StationOccupancy(stationId=row['stationId'], day=row['day'], chargerType=row['chargerType'],
+                             accepted=row['total'])
+            for row in rows
+        ], batch_size=1000)
+    return len(created)
+
+
+class OccupancyProvider:
+    """Bulk occupancy lookup for a set of candidate stations"""
+
+    def __init__(self, station_ids=None, day=None):
+        self.day = day or today()
+        self.counts = get_accepted_counts(station_ids, self.day)
+
+    def get_count(self, station_id):
+        return self.counts.get(station_id, 0)
+
+    def get_rate(self, station):
+        """Occupancy rate (%) of a station from the preloaded counts"""
+        total_capacity = (station.rapidcharger or 0) + (station.fastCharger or 0) + (station.slowcharger or 0)
+        if total_capacity == 0:
+            return 0
+        return (self.get_count(station.stationId) / total_capacity) * 100
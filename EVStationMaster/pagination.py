@@ -0,0 +1,94 @@
+import base64
+import json
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def _cursor_value(value):
+    # isoformat keeps microseconds, which DjangoJSONEncoder drops from datetimes
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_cursor_value(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Key values from an opaque cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def cursor_values(model, ordering, cursor):
+    """Cursor values converted to the ordering fields' types, or None if the cursor does not fit them"""
+    values = decode_cursor(cursor)
+    if values is None or len(values) != len(ordering):
+        return None
+    try:
+        values = [model._meta.get_field(name).to_python(value) for name, value in zip(ordering, values)]
+    except (ValidationError, TypeError, ValueError):
+        return None
+    return None if None in values else values
+
+
+def _after(ordering, values):
+    """Q for rows strictly after `values` in ascending `ordering` (row-value comparison)"""
+    condition = Q()
+    for i in reversed(range(len(ordering))):
+        step = Q(**{f'{ordering[i]}__gt': values[i]})
+        if i < len(ordering) - 1:
+            step |= Q(**{ordering[i]: values[i]}) & condition
+        condition = step
+    return condition
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, items, next_cursor, page_size):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.has_next = next_cursor is not None
+        self.page_size = page_size
+
+    def to_dict(self, fields):
+        return {
+            'results': [{field: getattr(item, field) for field in fields} for item in self.items],
+            'next_cursor': self.next_cursor,
+            'page_size': self.page_size,
+        }
+
+
+def keyset_page(queryset, cursor=None, page_size=50, ordering=('id',)):
+    """Fetch the page after `cursor`; cost stays O(page_size) however deep the page"""
+    ordering = list(ordering)
+    if ordering[-1] != 'id':
+        ordering.append('id')  # unique tie-breaker keeps the order stable
+
+    values = cursor_values(queryset.model, ordering, cursor)
+    queryset = queryset.order_by(*ordering)
+    if values is not None:
+        queryset = queryset.filter(_after(ordering, values))
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor([getattr(items[-1], field) for field in ordering])
+    return KeysetPage(items, next_cursor, page_size)
+
+
+def page_size_from(request, default=50, maximum=200):
+    try:
+        return min(max(int(request.GET.get('page_size', default)), 1), maximum)
+    except ValueError:
+        return default
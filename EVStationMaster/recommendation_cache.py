@@ -0,0 +1,219 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+ALL_REGIONS = '*'
+
+
+def geohash(lat, lng, precision=6):
+    """Standard base32 geohash of a point"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    code = []
+    bits = 0
+    value = 0
+    even = True
+    while len(code) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            code.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(code)
+
+
+def geohash_cell_size(precision):
+    """(lat, lng) size in degrees of a geohash cell"""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def geohash_neighbourhood(lat, lng, precision):
+    """The cell containing the point and its eight neighbours"""
+    dlat, dlng = geohash_cell_size(precision)
+    return {
+        geohash(max(min(lat + i * dlat, 90.0), -90.0), (lng + j * dlng + 180.0) % 360.0 - 180.0, precision)
+        for i in (-1, 0, 1) for j in (-1, 0, 1)
+    }
+
+
+class LocalCacheBackend:
+    """In-process TTL + LRU store, the default for single-worker deployments"""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.generations = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_generations(self, regions):
+        with self.lock:
+            return [self.generations.get(region, 0) for region in regions]
+
+    def bump_generation(self, region):
+        with self.lock:
+            self.generations[region] = self.generations.get(region, 0) + 1
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DjangoCacheBackend:
+    """Shared store on a Django cache alias (e.g. Redis/Memcached) for multi-worker deployments"""
+
+    def __init__(self, alias='default', generation_timeout=None):
+        from django.core.cache import caches
+
+        self.cache = caches[alias]
+        self.generation_timeout = generation_timeout  # None keeps region generations forever
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, ttl)
+
+    def get_generations(self, regions):
+        keys = [f'reco-gen:{region}' for region in regions]
+        found = self.cache.get_many(keys)
+        return [found.get(key, 0) for key in keys]
+
+    def bump_generation(self, region):
+        key = f'reco-gen:{region}'
+        self.cache.add(key, 0, self.generation_timeout)
+        try:
+            self.cache.incr(key)
+        except ValueError:  # evicted between add and incr
+            self.cache.set(key, 1, self.generation_timeout)
+
+
+class RecommendationCache:
+    """Recommendation results keyed by geohash cell, charger preference and time bucket
+
+    Each entry records the generation of the region its candidate stations fall in:
+    the coarsest geohash prefix whose 3x3 neighbourhood still covers them. Invalidating
+    a point bumps the regions around it at every precision, so an entry misses whenever
+    a station it could have ranked changes, in every worker sharing the backend.
+    """
+
+    def __init__(self, backend=None, precision=6, region_precision=5, bucket_seconds=60, ttl=60):
+        self.backend = backend or LocalCacheBackend()
+        self.precision = precision  # ~1.2 x 0.6 km cells
+        self.region_precision = region_precision  # finest invalidation regions, ~4.9 x 4.9 km
+        self.bucket_seconds = bucket_seconds
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, lat, lng, charger_preference, limit, model_version, now=None):
+        cell = geohash(lat, lng, self.precision)
+        bucket = int((now if now is not None else time.time()) // self.bucket_seconds)
+        return f'reco:{cell}:{charger_preference}:{limit}:{model_version}:{bucket}'
+
+    def region_precision_for(self, lat, reach_km):
+        """Finest precision whose 3x3 neighbourhood of any station within reach_km covers the point"""
+        if reach_km is None:
+            return 0
+        reach_lat = reach_km / 110.5
+        reach_lng = reach_km / max(111.3 * math.cos(math.radians(min(abs(lat), 90.0))), 1e-9)
+        for precision in range(self.region_precision, 0, -1):
+            dlat, dlng = geohash_cell_size(precision)
+            if reach_lat <= dlat and reach_lng <= dlng:
+                return precision
+        return 0
+
+    def get_or_compute(self, lat, lng, charger_preference, limit, model_version, compute, reach=None):
+        """Cached result for the cell, or compute() stored under it
+
+        reach() gives the distance (km) to the farthest station the result depends
+        on; without it the entry is dropped by any invalidation.
+        """
+        key = self.key(lat, lng, charger_preference, limit, model_version)
+        cell = geohash(lat, lng, self.precision)
+        entry = self.backend.get(key)
+        if entry is not None:
+            precision, generations, value = entry
+            if self.backend.get_generations([ALL_REGIONS, cell[:precision]]) == generations:
+                with self.lock:
+                    self.hits += 1
+                return value
+        with self.lock:
+            self.misses += 1
+        # Generations are read before computing, so an invalidation during compute() is not lost
+        regions = [cell[:precision] for precision in range(self.region_precision + 1)]
+        generations = self.backend.get_generations([ALL_REGIONS] + regions)
+        value = compute()
+        precision = self.region_precision_for(lat, reach() if reach is not None else None)
+        self.backend.set(key, (precision, [generations[0], generations[precision + 1]], value), self.ttl)
+        return value
+
+    def invalidate_near(self, lat, lng):
+        """Drop entries whose candidate stations could include a point that changed"""
+        if lat is None or lng is None:
+            return
+        self.backend.bump_generation('')
+        for precision in range(1, self.region_precision + 1):
+            for region in geohash_neighbourhood(lat, lng, precision):
+                self.backend.bump_generation(region)
+        with self.lock:
+            self.invalidations += 1
+
+    def invalidate_all(self):
+        """Drop every entry, e.g. after a bulk station import"""
+        self.backend.bump_generation(ALL_REGIONS)
+        with self.lock:
+            self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            hits, misses, invalidations = self.hits, self.misses, self.invalidations
+        lookups = hits + misses
+        stats = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'invalidations': invalidations,
+        }
+        if isinstance(self.backend, LocalCacheBackend):
+            stats['entries'] = len(self.backend)
+        return stats
+
+
+def cache_from_settings():
+    """RecommendationCache on settings.RECOMMENDATION_CACHE_ALIAS if set, else in-process"""
+    from django.conf import settings
+
+    alias = getattr(settings, 'RECOMMENDATION_CACHE_ALIAS', None)
+    return RecommendationCache(DjangoCacheBackend(alias) if alias else None)
@@ -0,0 +1,97 @@
+import threading
+import time
+
+from django.db import connection
+
+
+class RefreshingIndex:
+    """Base of the in-process station indexes, rebuilt from the database every refresh_interval
+
+    Subclasses keep their data in the attributes named by data_attributes, implement
+    _load() to return a new, unshared instance filled from the database and _apply()
+    to apply one saved station. Rebuilds load without holding the lock and swap the
+    result in, so readers keep using the old data meanwhile; updates that arrive
+    during a rebuild are replayed onto the new data. Only the first build blocks a
+    request: later refreshes run on a background thread.
+    """
+
+    data_attributes = ()
+
+    def __init__(self, refresh_interval=300):
+        self.refresh_interval = refresh_interval  # seconds, picks up writes from other workers
+        self.built_at = None
+        self.replay = None  # stations updated while a rebuild is loading
+        self.lock = threading.Lock()  # guards the data attributes
+        self.build_lock = threading.Lock()  # one rebuild at a time
+        self.refresh_thread = None
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _apply(self, station):
+        raise NotImplementedError
+
+    def _stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > self.refresh_interval
+
+    def _rebuild(self):
+        started = time.monotonic()
+        with self.lock:
+            self.replay = []
+        try:
+            fresh = self._load()
+            with self.lock:
+                for name in self.data_attributes:
+                    setattr(self, name, getattr(fresh, name))
+                for station in self.replay:
+                    self._apply(station)
+                self.built_at = started
+        finally:
+            with self.lock:
+                self.replay = None
+
+    def build(self):
+        """Rebuild from the database, e.g. after a bulk write"""
+        with self.build_lock:
+            self._rebuild()
+
+    def warm(self):
+        """Start the first build on a background thread, e.g. at startup; requests meanwhile wait for it"""
+        if self.built_at is None and self.build_lock.acquire(blocking=False):
+            self.refresh_thread = threading.Thread(target=self._refresh, name=f'{type(self).__name__}-warm',
+                                                   daemon=True)
+            self.refresh_thread.start()
+
+    def ensure_built(self):
+        """Build on first use; a stale index is refreshed in the background while callers read it"""
+        if not self._stale():
+            return
+        if self.built_at is None:
+            with self.build_lock:
+                if self.built_at is None:
+                    self._rebuild()
+            return
+        if self.build_lock.acquire(blocking=False):
+            self.refresh_thread = threading.Thread(target=self._refresh, name=f'{type(self).__name__}-refresh',
+                                                   daemon=True)
+            self.refresh_thread.start()
+
+    def _refresh(self):
+        """Background build started by warm or ensure_built; holds build_lock on entry"""
+        try:
+            if self._stale():
+                self._rebuild()
+        except Exception as e:
+            print(f"Error refreshing {type(self).__name__}: {e}")
+        finally:
+            self.build_lock.release()
+            connection.close()
+
+    def update(self, station):
+        """Apply a station after it has been saved"""
+        with self.lock:
+            if self.built_at is None and self.replay is None:
+                return  # the first build reads it from the database
+            self._apply(station)
+            if self.replay is not None:
+                self.replay.append(station)
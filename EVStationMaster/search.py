@@ -0,0 +1,140 @@
+from django.db import connection
+from django.db.models import Func, TextField
+
+from EVStationMaster.refreshing_index import RefreshingIndex
+
+# Fields that make up each searchable document of a station
+SEARCH_FIELDS = {
+    'name': ('stationName',),
+    'area': ('city', 'Area', 'loc1', 'loc2', 'loc3', 'loc4', 'loc5', 'loc6'),
+}
+
+
+def normalize(text):
+    return (text or '').strip().casefold()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def match_score(value, query):
+    """Relevance of one field value for a query it contains"""
+    if value == query:
+        return 4.0
+    if value.startswith(query):
+        return 3.0
+    if (' ' + query) in value:
+        return 2.0  # starts a word
+    return 1.0
+
+
+class TrigramSearchIndex(RefreshingIndex):
+    """In-process trigram inverted index over the search documents of active stations"""
+
+    data_attributes = ('documents', 'postings')
+
+    def __init__(self, refresh_interval=300):
+        super().__init__(refresh_interval)
+        self.documents = {}  # pk -> {domain: (stationName, [field values])}
+        self.postings = {domain: {} for domain in SEARCH_FIELDS}
+
+    def _document(self, station):
+        return {
+            domain: [normalize(getattr(station, field)) for field in fields]
+            for domain, fields in SEARCH_FIELDS.items()
+        }
+
+    def _insert(self, pk, name, document):
+        self.documents[pk] = (name, document)
+        for domain, values in document.items():
+            postings = self.postings[domain]
+            for gram in set().union(*(trigrams(value) for value in values)):
+                postings.setdefault(gram, set()).add(pk)
+
+    def _remove(self, pk):
+        entry = self.documents.pop(pk, None)
+        if entry is None:
+            return
+        for domain, values in entry[1].items():
+            postings = self.postings[domain]
+            for gram in set().union(*(trigrams(value) for value in values)):
+                members = postings.get(gram)
+                if members is not None:
+                    members.discard(pk)
+                    if not members:
+                        del postings[gram]
+
+    def _load(self):
+        """A new index of all active stations"""
+        from EVStationMaster.models import StationDetails
+
+        fields = sorted({field for fields in SEARCH_FIELDS.values() for field in fields})
+        fresh = TrigramSearchIndex()
+        for station in StationDetails.objects.filter(status='Active').only('pk', *fields).iterator():
+            fresh._insert(station.pk, station.stationName, fresh._document(station))
+        return fresh
+
+    def _apply(self, station):
+        """Re-index a station"""
+        self._remove(station.pk)
+        if station.status == 'Active':
+            self._insert(station.pk, station.stationName, self._document(station))
+
+    def search(self, query, domain):
+        """pks of stations whose fields contain the query, best match first"""
+        self.ensure_built()
+        query = normalize(query)
+        with self.lock:
+            grams = trigrams(query)
+            if grams:
+                # A document containing the query contains all of its trigrams
+                postings = self.postings[domain]
+                lists = sorted((postings.get(gram, set()) for gram in grams), key=len)
+                candidates = set(lists[0]).intersection(*lists[1:])
+            else:
+                candidates = self.documents.keys()
+
+            results = []
+            for pk in candidates:
+                name, document = self.documents[pk]
+                scores = [match_score(value, query) for value in document[domain] if query in value]
+                if scores:
+                    results.append((-max(scores), -len(scores), name, pk))
+        results.sort()
+        return [pk for _, _, _, pk in results]
+
+
+class SearchDocument(Func):
+    """lower(field || ' | ' || field ...), the expression migration 0011 indexes"""
+
+    function = 'lower'
+    arg_joiner = " || ' | ' || "
+    output_field = TextField()
+
+    def __init__(self, domain):
+        super().__init__(*SEARCH_FIELDS[domain])
+
+
+def search_stations(query, domain):
+    """Active stations matching a name/area query, ranked by relevance"""
+    from EVStationMaster.models import StationDetails
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        # Served by the pg_trgm GIN indexes created in migration 0011
+        value = normalize(query)
+        return list(
+            StationDetails.objects.filter(status='Active').annotate(
+                document=SearchDocument(domain),
+                rank=TrigramSimilarity('document', value),
+            ).filter(document__contains=value).order_by('-rank', 'stationName')
+        )
+
+    pks = station_search.search(query, domain)
+    stations = StationDetails.objects.filter(status='Active').in_bulk(pks)
+    return [stations[pk] for pk in pks if pk in stations]
+
+
+station_search = TrigramSearchIndex()
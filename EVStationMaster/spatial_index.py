@@ -0,0 +1,129 @@
+import math
+
+import numpy as np
+
+from EVStationMaster.distance import distance_km, min_distance_outside_km
+from EVStationMaster.refreshing_index import RefreshingIndex
+
+
+class StationGridIndex(RefreshingIndex):
+    """In-process lat/lng grid index of active stations for candidate pruning"""
+
+    data_attributes = ('cells', 'positions', 'bounds')
+
+    def __init__(self, cell_size=0.1, refresh_interval=300):
+        super().__init__(refresh_interval)
+        self.cell_size = cell_size  # degrees
+        self.cells = {}
+        self.positions = {}
+        self.bounds = None  # (min_row, max_row, min_col, max_col) of occupied cells, grows only
+
+    def _cell(self, lat, lng):
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size)))
+
+    def _insert(self, pk, lat, lng):
+        self.positions[pk] = (lat, lng)
+        row, col = cell = self._cell(lat, lng)
+        self.cells.setdefault(cell, set()).add(pk)
+        if self.bounds is None:
+            self.bounds = (row, row, col, col)
+        else:
+            min_row, max_row, min_col, max_col = self.bounds
+            self.bounds = (min(min_row, row), max(max_row, row), min(min_col, col), max(max_col, col))
+
+    def _remove(self, pk):
+        position = self.positions.pop(pk, None)
+        if position is None:
+            return
+        cell = self._cell(*position)
+        members = self.cells.get(cell)
+        if members is not None:
+            members.discard(pk)
+            if not members:
+                del self.cells[cell]
+
+    def _load(self):
+        """A new index of all active stations"""
+        from EVStationMaster.models import StationDetails
+
+        fresh = StationGridIndex(self.cell_size)
+        for pk, lat, lng in StationDetails.objects.filter(status='Active').values_list('pk', 'latitude', 'longitude'):
+            fresh._insert(pk, lat or 0.0, lng or 0.0)
+        return fresh
+
+    def _apply(self, station):
+        """Insert, move or drop a station"""
+        self._remove(station.pk)
+        if station.status == 'Active':
+            self._insert(station.pk, station.latitude or 0.0, station.longitude or 0.0)
+
+    def _ring(self, center, radius):
+        """Cells on the square ring at Chebyshev radius from center"""
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for d in range(-radius, radius + 1):
+            yield (row - radius, col + d)
+            yield (row + radius, col + d)
+        for d in range(-radius + 1, radius):
+            yield (row + d, col - radius)
+            yield (row + d, col + radius)
+
+    def _walk(self, lat, lng, k, radius):
+        """(distance, pk) pairs from a ring walk out of the user's cell
+
+        Stops once the rings cover every occupied cell; returns None when the walk
+        would visit more cells than there are stations, where a full scan is cheaper.
+        """
+        center = self._cell(lat, lng)
+        min_row, max_row, min_col, max_col = self.bounds
+        last_ring = max(abs(center[0] - min_row), abs(center[0] - max_row),
+                        abs(center[1] - min_col), abs(center[1] - max_col))
+
+        found = []
+        visited = 0
+        for ring in range(last_ring + 1):
+            visited += 8 * ring or 1
+            if visited > len(self.positions):
+                return None
+            # Anything outside this ring is at least ring * cell_size degrees away
+            bound = min_distance_outside_km(lat, ring * self.cell_size)
+            pks = [pk for cell in self._ring(center, ring) for pk in self.cells.get(cell, ())]
+            if pks:
+                positions = [self.positions[pk] for pk in pks]
+                distances = distance_km(lat, lng, [p[0] for p in positions], [p[1] for p in positions])
+                found.extend(zip(distances.tolist(), pks))
+            if radius is not None and bound > radius:
+                break
+            if k is not None and len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= bound:
+                    break
+        return found
+
+    def nearest(self, lat, lng, k=None, radius=None):
+        """Station pks ordered by distance, limited to k and/or radius (km)"""
+        self.ensure_built()
+        with self.lock:
+            if not self.positions:
+                return []
+            found = None
+            if k is None or k < len(self.positions):
+                found = self._walk(lat, lng, k, radius)
+            if found is None:
+                # Few stations, or they are far from the user: one vectorised pass over all of them
+                pks = list(self.positions)
+                positions = np.array([self.positions[pk] for pk in pks]).reshape(-1, 2)
+
+        if found is None:
+            distances = distance_km(lat, lng, positions[:, 0], positions[:, 1])
+            found = list(zip(distances.tolist(), pks))
+        found.sort()
+        if radius is not None:
+            found = [item for item in found if item[0] <= radius]
+        if k is not None:
+            found = found[:k]
+        return [pk for _, pk in found]
+
+station_index = StationGridIndex()
@@ -0,0 +1,202 @@
+import csv
+import json
+import re
+from collections import defaultdict
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+
+from EVStationMaster.id_allocator import allocate_station_ids, reserve_station_ids_through
+from EVStationMaster.models import StationDetails
+
+REQUIRED_FIELDS = ('stationName', 'email', 'username', 'password', 'city')
+# Values for columns a new station's row leaves out, matching stationRegistration
+NEW_STATION_DEFAULTS = {'status': 'Active'}
+MAX_REPORTED_ERRORS = 100
+
+# Array brackets, separators and whitespace between JSON objects
+JSON_SEPARATORS = re.compile(r'[\s,\[\]]*')
+
+
+def iter_csv(textfile):
+    """Rows of a CSV feed with a header line, one dict at a time"""
+    for row in csv.DictReader(textfile):
+        yield row
+
+
+def iter_json(textfile, read_size=65536):
+    """Objects of a JSON array (or JSON Lines) feed without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    while True:
+        pos = JSON_SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer):
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+                yield obj
+                continue
+            except ValueError:
+                if eof:
+                    raise
+        elif eof:
+            return
+        # Need more input: keep only the unparsed tail
+        chunk = textfile.read(read_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+class StationRowValidator:
+    """Coerces raw feed values to StationDetails field types"""
+
+    def __init__(self):
+        self.fields = {
+            field.name: field for field in StationDetails._meta.concrete_fields if not field.primary_key
+        }
+
+    def clean(self, row):
+        """(cleaned, errors) for the columns present; see missing_required for absent ones"""
+        cleaned = {}
+        errors = []
+        for name, value in row.items():
+            field = self.fields.get(name)
+            if field is None:
+                continue  # unknown columns are ignored
+            if isinstance(value, str):
+                value = value.strip()
+            if value in ('', None):
+                if name == 'stationId' or name in NEW_STATION_DEFAULTS:
+                    continue  # allocated / defaulted on create, left as is on update
+                value = field.get_default()
+            try:
+                value = field.to_python(value)
+                if field.max_length and len(value) > field.max_length:
+                    raise ValidationError(f"longer than {field.max_length} characters")
+                if name == 'email' and value:
+                    validate_email(value)
+            except ValidationError as e:
+                errors.append(f"{name}: {'; '.join(e.messages)}")
+                continue
+            cleaned[name] = value
+        for name in REQUIRED_FIELDS:
+            if name in cleaned and not cleaned[name]:
+                errors.append(f"{name}: required")
+        return cleaned, errors
+
+    def missing_required(self, cleaned):
+        """Errors for required columns a row creating a station leaves out; updates may omit them"""
+        return [f"{name}: required" for name in REQUIRED_FIELDS if name not in cleaned]
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'failed': self.failed, 'errors': self.errors}
+
+
+def _update_rows(rows):
+    """UPDATE existing stations by stationId, one executemany per set of supplied columns
+
+    bulk_update() builds a CASE expression per row, which dominates large imports.
+    """
+    meta = StationDetails._meta
+    groups = defaultdict(list)
+    for row in rows:
+        groups[tuple(sorted(name for name in row if name != 'stationId'))].append(row)
+
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for names, group in groups.items():
+            if not names:
+                continue
+            fields = [meta.get_field(name) for name in names]
+            assignments = ', '.join(f"{quote(field.column)} = %s" for field in fields)
+            sql = f"UPDATE {quote(meta.db_table)} SET {assignments} WHERE {quote(meta.get_field('stationId').column)} = %s"
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(row[field.name], connection) for field in fields] + [row['stationId']]
+                for row in group
+            ])
+
+
+def _write_batch(batch, result, validator, update_existing):
+    """Insert/update one validated batch of (line, row) pairs inside a single transaction"""
+    with transaction.atomic():
+        given_ids = [row['stationId'] for _, row in batch if 'stationId' in row]
+        existing = set()
+        if given_ids:
+            existing = set(StationDetails.objects.filter(stationId__in=given_ids).values_list('stationId', flat=True))
+
+        to_create = []
+        to_update = []
+        for line, row in batch:
+            if row.get('stationId') not in existing:
+                errors = validator.missing_required(row)
+                if errors:
+                    result.add_error(line, errors)
+                    continue
+                to_create.append(StationDetails(**{**NEW_STATION_DEFAULTS, **row}))
+            elif update_existing:
+                to_update.append(row)
+
+        # New rows without a stationId get a block from the counter
+        supplied = [station.stationId for station in to_create if station.stationId is not None]
+        if supplied:
+            reserve_station_ids_through(max(supplied))
+        missing = [station for station in to_create if station.stationId is None]
+        if missing:
+            for station, station_id in zip(missing, allocate_station_ids(len(missing))):
+                station.stationId = station_id
+
+        StationDetails.objects.bulk_create(to_create)
+        _update_rows(to_update)
+    result.created += len(to_create)
+    result.updated += len(to_update)
+
+
+def import_stations(rows, batch_size=1000, update_existing=False):
+    """Validate and write station rows in batches; memory is bounded by batch_size
+
+    Rows for stations that already exist are skipped unless update_existing is set; an
+    update only needs the columns it changes.
+    """
+    validator = StationRowValidator()
+    result = ImportResult()
+    rows = iter(rows)
+    line = 0
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        batch = {}
+        unnumbered = []
+        for row in chunk:
+            line += 1
+            if not isinstance(row, dict):
+                result.add_error(line, ["not an object"])
+                continue
+            cleaned, errors = validator.clean(row)
+            if errors:
+                result.add_error(line, errors)
+            elif 'stationId' in cleaned:
+                batch[cleaned['stationId']] = (line, cleaned)  # a later duplicate wins
+            else:
+                unnumbered.append((line, cleaned))
+        if batch or unnumbered:
+            _write_batch(list(batch.values()) + unnumbered, result, validator, update_existing)
+    return result
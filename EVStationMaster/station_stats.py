@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, Greatest
+
+# total_bookings counts accepted bookings; average_rating is rating_sum / rating_count over rated bookings
+COUNTED_STATUS = 'Accept'
+RATINGS = range(1, 6)
+
+
+def parse_rating(value):
+    """A 1-5 rating from form input, else None"""
+    try:
+        rating = int(value)
+    except (TypeError, ValueError):
+        return None
+    return rating if rating in RATINGS else None
+
+
+def record_rating(station_id, old_rating, new_rating):
+    """Fold a booking's rating (or re-rating) into the station's running sum, count and average
+
+    Call inside the transaction that saves the booking. The sum and count move with F()
+    so concurrent ratings cannot lose updates; the average is recomputed from them in a
+    second UPDATE, as backends differ on whether one UPDATE reads its own new values.
+    The count is floored at 1 so stations not yet recomputed cannot divide by zero.
+    """
+    from EVStationMaster.models import StationDetails
+
+    if not new_rating or new_rating == old_rating:
+        return
+    stations = StationDetails.objects.filter(stationId=station_id)
+    stations.update(
+        rating_sum=F('rating_sum') + (new_rating - (old_rating or 0)),
+        rating_count=F('rating_count') + (0 if old_rating else 1),
+    )
+    stations.update(average_rating=Cast(F('rating_sum'), FloatField()) / Greatest(F('rating_count'), 1))
+
+
+def record_status_change(station_id, old_status, new_status):
+    """Move total_bookings for a booking's status transition; call inside the write's transaction"""
+    from EVStationMaster.models import StationDetails
+
+    delta = (new_status == COUNTED_STATUS) - (old_status == COUNTED_STATUS)
+    if delta == 0:
+        return
+    StationDetails.objects.filter(stationId=station_id).update(total_bookings=F('total_bookings') + delta)
+
+
+def recompute_station_stats(batch_size=1000):
+    """Rebuild every station's statistics from the bookings; returns the number of stations changed"""
+    from EVStationMaster.models import SlotBooking, StationDetails
+
+    rated = Q(user_rating__gt=0)
+    rows = SlotBooking.objects.values('stationId').annotate(
+        accepted=Count('id', filter=Q(status=COUNTED_STATUS)),
+        rating_sum=Sum('user_rating', filter=rated),
+        rating_count=Count('id', filter=rated),
+    ).order_by()
+    totals = {
+        row['stationId']: (row['accepted'], row['rating_sum'] or 0, row['rating_count'])
+        for row in rows
+    }
+
+    fields = ['total_bookings', 'rating_sum', 'rating_count', 'average_rating']
+    stations = StationDetails.objects.only('pk', 'stationId', *fields).iterator(chunk_size=batch_size)
+    changed = []
+    with transaction.atomic():
+        for station in stations:
+            accepted, rating_sum, rating_count = totals.get(station.stationId, (0, 0, 0))
+            average = rating_sum / rating_count if rating_count else 0.0
+            if (station.total_bookings, station.rating_sum, station.rating_count, station.average_rating) == (
+                    accepted, rating_sum, rating_count, average):
+                continue
+            station.total_bookings = accepted
+            station.rating_sum = rating_sum
+            station.rating_count = rating_count
+            station.average_rating = average
+            changed.append(station)
+        StationDetails.objects.bulk_update(changed, fields, batch_size=batch_size)
+    return len(changed)
@@ -1,3 +1,1391 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, F, QuerySet, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from EVStationMaster.features import FEATURE_NAMES
+from EVStationMaster.model_registry import ModelSnapshot
+from EVStationMaster.occupancy import OccupancyProvider, booking_time
+from EVStationMaster.wait_time import FAST, OCCUPANCY, RAPID, SLOW, WaitTimeModel, predict_wait, queueing_wait
+
+# Benchmarks print timings and take minutes at the largest sizes; run with EV_BENCHMARKS=1
+RUN_BENCHMARKS = os.environ.get('EV_BENCHMARKS') == '1'
+
+MUMBAI = (19.0760, 72.8777)
+
+
+def station_rows(n, seed=0):
+    """n random STATION_FEATURE_FIELDS rows around Mumbai"""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        np.arange(1, n + 1), rng.integers(0, 4, n), rng.integers(0, 4, n), rng.integers(0, 4, n),
+        rng.integers(0, 20, n), rng.uniform(0, 5, n), rng.integers(0, 500, n), rng.integers(0, 10, n),
+        rng.uniform(18.9, 19.3, n), rng.uniform(72.8, 73.0, n),
+    ]).astype(float)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class BatchScoringTests(TestCase):
+    """The batched scoring path against one transform/predict call per station"""
+
+    def setUp(self):
+        from EVStationMaster.views import StationRecommendationEngine
+
+        self.engine = StationRecommendationEngine()
+        self.now = datetime(2024, 1, 15, 18, 30)
+        self.occupancy = OccupancyProvider([])
+        features = self.engine.prepare_feature_matrix(station_rows(500, seed=1), MUMBAI, self.now, None, self.occupancy)
+        scaler = StandardScaler().fit(features)
+        model = RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42).fit(
+            scaler.transform(features), np.random.default_rng(1).uniform(1, 5, len(features))
+        )
+        self.snapshot = ModelSnapshot(model, scaler, 'test', FEATURE_NAMES)
+
+    def score_batch(self, rows, preferences=None):
+        return self.engine.score_stations(self.snapshot, rows, MUMBAI, self.now, preferences, self.occupancy)[1]
+
+    def score_each(self, rows, preferences=None):
+        return np.concatenate([self.score_batch(rows[i:i + 1], preferences) for i in range(len(rows))])
+
+    def test_batch_matches_per_station_scores(self):
+        rows = station_rows(300)
+        for preferences in (None, {'charger_type': 'rapid'}):
+            np.testing.assert_allclose(self.score_batch(rows, preferences), self.score_each(rows, preferences),
+                                       rtol=1e-12)
+
+    def test_empty_candidate_set(self):
+        self.assertEqual(len(self.score_batch(station_rows(0))), 0)
+
+    @skipUnless(RUN_BENCHMARKS, "set EV_BENCHMARKS=1")
+    def test_benchmark_batch_scoring(self):
+        sample = 200  # per-station timings are extrapolated from this many stations
+        for n in (1000, 10000, 100000):
+            rows = station_rows(n)
+            _, batch = timed(self.score_batch, rows)
+            _, each = timed(self.score_each, rows[:sample])
+            each *= n / sample
+            print(f"\n{n} stations: batch {batch * 1000:.1f} ms, per station ~{each * 1000:.0f} ms, "
+                  f"{each / batch:.0f}x")
+            self.assertLess(batch, each)
+
+
+class SpatialIndexTests(TestCase):
+    """Grid index lookups against a brute-force haversine scan"""
+
+    def build_index(self, positions):
+        from EVStationMaster.models import StationDetails
+        from EVStationMaster.spatial_index import StationGridIndex
+
+        StationDetails.objects.bulk_create([
+            StationDetails(stationId=i + 1, stationName=f's{i}', email='s@example.com', mobileNo='1',
+                           username=f'u{i}', password='p', status='Active', latitude=lat, longitude=lng)
+            for i, (lat, lng) in enumerate(positions)
+        ])
+        index = StationGridIndex()
+        index.build()
+        return index
+
+    def assert_matches_scan(self, index, lat, lng, k=None, radius=None):
+        from EVStationMaster.distance import distance_km
+
+        pks, positions = zip(*index.positions.items())
+        positions = np.array(positions)
+        expected = sorted(zip(distance_km(lat, lng, positions[:, 0], positions[:, 1]).tolist(), pks))
+        if radius is not None:
+            expected = [item for item in expected if item[0] <= radius]
+        if k is not None:
+            expected = expected[:k]
+        self.assertEqual(index.nearest(lat, lng, k=k, radius=radius), [pk for _, pk in expected])
+
+    def test_matches_scan(self):
+        rng = np.random.default_rng(3)
+        index = self.build_index(zip(rng.uniform(18.9, 19.3, 500), rng.uniform(72.8, 73.0, 500)))
+        for lat, lng in zip(rng.uniform(18.5, 19.5, 50), rng.uniform(72.5, 73.5, 50)):
+            for k, radius in ((1, None), (20, None), (None, 5.0), (50, 10.0), (None, None)):
+                self.assert_matches_scan(index, lat, lng, k, radius)
+
+    def test_far_away_stations_are_found_quickly(self):
+        # Stations left at the default 0,0 coordinates, a user in Mumbai
+        index = self.build_index([(0.0, 0.0)] * 50 + [(10.0, -100.0)])
+        start = time.perf_counter()
+        for k in (1, 5, 100):
+            self.assert_matches_scan(index, *MUMBAI, k=k)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+
+class FeatureStoreTests(TestCase):
+    """Static station columns served from the float32 store instead of the ORM"""
+
+    def setUp(self):
+        from EVStationMaster.models import StationDetails
+
+        seed_stations(40)
+        rng = np.random.default_rng(4)
+        for station in StationDetails.objects.all():
+            station.Pspaces = int(rng.integers(0, 20))
+            station.average_rating = float(rng.integers(0, 11) / 2)
+            station.total_bookings = int(rng.integers(0, 500))
+            station.save()
+
+    def store(self):
+        from EVStationMaster.feature_store import StationFeatureStore
+
+        store = StationFeatureStore()
+        store.build()
+        return store
+
+    def database_columns(self, pks):
+        from EVStationMaster.features import STATION_FEATURE_FIELDS
+        from EVStationMaster.models import StationDetails
+
+        rows = dict((row[0], row[1:]) for row in StationDetails.objects.values_list('pk', *STATION_FEATURE_FIELDS))
+        return np.array([rows[pk] for pk in pks], dtype=float)
+
+    def test_rows_match_the_database_in_request_order(self):
+        from EVStationMaster.models import StationDetails
+
+        pks = list(StationDetails.objects.values_list('pk', flat=True))[::-3]
+        found, columns = self.store().get_rows(pks[:5] + [10 ** 6] + pks[5:])
+        self.assertEqual(found, pks)
+        self.assertEqual(columns.dtype, np.float64)
+        np.testing.assert_allclose(columns, self.database_columns(pks), rtol=1e-6)
+
+    def test_updates_overwrite_rows_and_grow_the_matrix(self):
+        from EVStationMaster.models import StationDetails
+
+        store = self.store()
+        station = StationDetails.objects.get(stationId=2)
+        station.fastCharger = None
+        station.total_bookings = 7
+        store.update(station)
+        added = StationDetails.objects.bulk_create([
+            StationDetails(stationId=100 + i, stationName=f'n{i}', email='s@example.com', mobileNo='1',
+                           username=f'n{i}', password='p', status='Active', rapidcharger=i, latitude=19.0, longitude=72.9)
+            for i in range(30)
+        ])
+        for new_station in added:
+            store.update(new_station)
+
+        pks = list(StationDetails.objects.order_by('pk').values_list('pk', flat=True))
+        expected = self.database_columns(pks)
+        expected[pks.index(station.pk), [2, 6]] = [0, 7]  # the unsaved edit, blank charger count as 0
+        found, columns = store.get_rows(pks)
+        self.assertEqual(found, pks)
+        np.testing.assert_allclose(columns, expected, rtol=1e-6)
+
+    def test_refresh_reloads_a_station(self):
+        from EVStationMaster.models import StationDetails
+
+        store = self.store()
+        StationDetails.objects.filter(stationId=5).update(total_bookings=1234, average_rating=4.5)
+        pk = StationDetails.objects.get(stationId=5).pk
+        self.assertNotEqual(store.get_rows([pk])[1][0, 6], 1234)
+        store.refresh(5)
+        self.assertEqual(store.get_rows([pk])[1][0, 5:7].tolist(), [4.5, 1234])
+
+    def test_empty_store(self):
+        from EVStationMaster.feature_store import StationFeatureStore
+        from EVStationMaster.models import StationDetails
+
+        StationDetails.objects.all().delete()
+        store = StationFeatureStore()
+        found, columns = store.get_rows([1, 2])
+        self.assertEqual((found, columns.shape), ([], (0, 10)))
+        self.assertEqual(store.get_rows([])[1].shape, (0, 10))
+
+    def test_recommendations_score_store_columns_and_see_station_writes(self):
+        from EVStationMaster.feature_store import StationFeatureStore
+        from EVStationMaster.models import StationDetails
+        from EVStationMaster.spatial_index import StationGridIndex
+        from EVStationMaster import views
+
+        # Scores are the total_bookings feature, so the ranking shows which columns were used
+        model = mock.Mock(predict=lambda features: features[:, FEATURE_NAMES.index('total_bookings')])
+        scaler = mock.Mock(transform=lambda features: features)
+        engine = views.StationRecommendationEngine()
+        engine.registry.get = lambda: ModelSnapshot(model, scaler, 'test', FEATURE_NAMES)
+        store, index = StationFeatureStore(), StationGridIndex()
+
+        with mock.patch.object(views, 'station_features', store), mock.patch.object(views, 'station_index', index):
+            expected = list(StationDetails.objects.order_by('-total_bookings', 'pk').values_list('pk', flat=True)[:3])
+            ranked = engine.get_recommendations(MUMBAI, limit=3)
+            self.assertEqual([item['station'].pk for item in ranked], expected)
+            self.assertEqual([item['score'] for item in ranked],
+                             [StationDetails.objects.get(pk=pk).total_bookings for pk in expected])
+
+            with mock.patch.object(StationFeatureStore, '_load', side_effect=AssertionError('rebuilt')):
+                station = StationDetails.objects.get(stationId=9)
+                station.total_bookings = 10000
+                station.save()
+                views.refresh_station_caches(station)
+                self.assertEqual(engine.get_recommendations(MUMBAI, limit=1)[0]['station'].pk, station.pk)
+
+
+class DistanceTests(TestCase):
+    """Haversine and equirectangular kernels against reference distances"""
+
+    # Published great-circle distances (spherical earth), km
+    CITY_PAIRS = [
+        ((51.5074, -0.1278), (48.8566, 2.3522), 343.5),  # London - Paris
+        ((40.7128, -74.0060), (51.5074, -0.1278), 5570.0),  # New York - London
+        ((19.0760, 72.8777), (28.7041, 77.1025), 1150.0),  # Mumbai - Delhi
+        ((-33.8688, 151.2093), (-37.8136, 144.9631), 713.0),  # Sydney - Melbourne
+        ((19.0760, 72.8777), (18.5204, 73.8567), 120.0),  # Mumbai - Pune
+    ]
+
+    def test_city_pairs(self):
+        from EVStationMaster.distance import haversine_km
+
+        for (lat1, lng1), (lat2, lng2), expected in self.CITY_PAIRS:
+            self.assertAlmostEqual(float(haversine_km(lat1, lng1, lat2, lng2)) / expected, 1.0, delta=0.005)
+            self.assertAlmostEqual(float(haversine_km(lat2, lng2, lat1, lng1)) / expected, 1.0, delta=0.005)
+
+    def test_exact_geometry(self):
+        from EVStationMaster.distance import EARTH_RADIUS_KM, KM_PER_DEGREE, haversine_km
+
+        self.assertEqual(float(haversine_km(19.0, 72.0, 19.0, 72.0)), 0.0)
+        self.assertAlmostEqual(float(haversine_km(0, 0, 90, 0)), np.pi / 2 * EARTH_RADIUS_KM, places=6)
+        self.assertAlmostEqual(float(haversine_km(0, 0, 0, 180)), np.pi * EARTH_RADIUS_KM, places=6)
+        self.assertAlmostEqual(float(haversine_km(10, 20, 11, 20)), KM_PER_DEGREE, places=6)
+
+    def test_vectorised_matches_scalar(self):
+        from EVStationMaster.distance import distance_km
+
+        rng = np.random.default_rng(4)
+        lats, lngs = rng.uniform(-80, 80, 1000), rng.uniform(-180, 180, 1000)
+        for method in ('haversine', 'equirectangular'):
+            vector = distance_km(MUMBAI[0], MUMBAI[1], lats, lngs, method)
+            scalar = [float(distance_km(MUMBAI[0], MUMBAI[1], lat, lng, method)) for lat, lng in zip(lats, lngs)]
+            np.testing.assert_allclose(vector, scalar, rtol=1e-12)
+
+    def test_equirectangular_close_at_short_range(self):
+        from EVStationMaster.distance import equirectangular_km, haversine_km
+
+        rng = np.random.default_rng(5)
+        lats, lngs = rng.uniform(18.0, 20.0, 1000), rng.uniform(72.0, 74.0, 1000)
+        np.testing.assert_allclose(equirectangular_km(*MUMBAI, lats, lngs), haversine_km(*MUMBAI, lats, lngs),
+                                   rtol=1e-3)
+
+    def test_min_distance_outside_is_a_lower_bound(self):
+        from EVStationMaster.distance import haversine_km, min_distance_outside_km
+
+        rng = np.random.default_rng(6)
+        for lat in (0.0, 19.0, -45.0, 70.0):
+            for degrees in (0.1, 1.0, 5.0):
+                lats = lat + rng.uniform(-30, 30, 2000)
+                lngs = rng.uniform(-180, 180, 2000)
+                outside = (np.abs(lats - lat) > degrees) | (np.abs(lngs) > degrees)
+                inside_sphere = np.abs(lats) <= 90
+                distances = haversine_km(lat, 0.0, lats, lngs)[outside & inside_sphere]
+                self.assertLessEqual(min_distance_outside_km(lat, degrees), distances.min() + 1e-9)
+
+    @skipUnless(RUN_BENCHMARKS, "set EV_BENCHMARKS=1")
+    def test_benchmark_distance_kernels(self):
+        import math
+
+        from EVStationMaster.distance import equirectangular_km, haversine_km
+
+        rng = np.random.default_rng(7)
+        n = 1_000_000
+        lats, lngs = rng.uniform(18.0, 20.0, n), rng.uniform(72.0, 74.0, n)
+
+        def python_loop(sample):
+            lat1, lng1 = map(math.radians, MUMBAI)
+            for lat, lng in zip(lats[:sample], lngs[:sample]):
+                lat2, lng2 = math.radians(lat), math.radians(lng)
+                a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+                2 * 6371.0088 * math.asin(math.sqrt(a))
+
+        _, haversine = timed(haversine_km, *MUMBAI, lats, lngs)
+        _, equirectangular = timed(equirectangular_km, *MUMBAI, lats, lngs)
+        _, loop = timed(python_loop, 100000)
+        loop *= n / 100000
+        print(f"\n{n} points: haversine {haversine * 1000:.1f} ms, equirectangular {equirectangular * 1000:.1f} ms, "
+              f"python loop ~{loop * 1000:.0f} ms")
+        self.assertLess(haversine, loop)
+
+
+class ModelStoreTests(TestCase):
+    """Versioned bundles, pruning and rollback through the management command"""
+
+    def test_rollback_command(self):
+        from EVStationMaster.model_store import ModelArtifactStore
+
+        with tempfile.TemporaryDirectory() as root, override_settings(ML_MODELS_ROOT=root):
+            store = ModelArtifactStore(keep=2)
+            versions = [store.save({'n': n}, None, FEATURE_NAMES) for n in range(3)]
+            self.assertEqual(store.list_versions(), versions[1:])
+
+            call_command('rollback_model', stdout=io.StringIO())
+            self.assertEqual(store.current_version(), versions[1])
+            self.assertEqual(store.load()['model'], {'n': 1})
+
+            call_command('rollback_model', versions[2], stdout=io.StringIO())
+            self.assertEqual(store.current_version(), versions[2])
+
+
+def seed_stations(n, seed=0):
+    from EVStationMaster.models import StationDetails
+
+    rng = np.random.default_rng(seed)
+    return StationDetails.objects.bulk_create([
+        StationDetails(stationId=i + 1, stationName=f's{i}', email='s@example.com', mobileNo='1',
+                       username=f'u{i}', password='p', status='Active',
+                       rapidcharger=int(rng.integers(0, 4)), fastCharger=int(rng.integers(0, 4)),
+                       slowcharger=int(rng.integers(0, 4)), latitude=float(rng.uniform(18.9, 19.3)),
+                       longitude=float(rng.uniform(72.8, 73.0)))
+        for i in range(n)
+    ])
+
+
+def seed_bookings(n, station_count, seed=0, **fields):
+    from EVStationMaster.models import SlotBooking
+
+    rng = np.random.default_rng(seed)
+    now = datetime.now()
+    return SlotBooking.objects.bulk_create([
+        SlotBooking(**dict(dict(
+            stationId=int(rng.integers(1, station_count + 1)), customerName=f'c{i}', vehicleRegistration='MH01',
+            chargerType=str(rng.choice(['rapidcharger', 'fastCharger', 'slowcharger'])),
+            arrivalTime=now - timedelta(days=int(rng.integers(0, 30)), hours=int(rng.integers(0, 12))),
+            status='Accept', userRemark=str(rng.choice(['good', 'bad', 'ok'])), unit=1, time=60, amount=10,
+        ), **fields))
+        for i in range(n)
+    ])
+
+
+class IncrementalTrainingTests(TestCase):
+    """Warm-start updates against the change watermark and the full-history base"""
+
+    def setUp(self):
+        from EVStationMaster.views import StationRecommendationEngine
+
+        self.root = tempfile.TemporaryDirectory()
+        self.settings = override_settings(ML_MODELS_ROOT=self.root.name)
+        self.settings.enable()
+        seed_stations(50)
+        seed_bookings(200, 50)
+        self.late = seed_bookings(30, 50, seed=1, status='Request Pending')
+        self.engine = StationRecommendationEngine()
+        self.assertTrue(self.engine.train_model())
+
+    def tearDown(self):
+        self.settings.disable()
+        self.root.cleanup()
+
+    def update(self):
+        return self.engine.train_model(mode='incremental')
+
+    def test_bookings_accepted_after_training_are_picked_up(self):
+        from EVStationMaster.models import SlotBooking
+
+        base_trees = [tree.random_state for tree in self.engine.registry.snapshot.model.estimators_]
+        self.assertFalse(self.update())
+
+        time.sleep(0.01)
+        for booking in self.late:
+            booking.status = 'Accept'
+            booking.save(update_fields=['status', 'updated_at'])
+        self.assertTrue(self.update())
+
+        snapshot = self.engine.registry.snapshot
+        self.assertEqual(snapshot.metadata['n_samples'], 230)
+        self.assertEqual([tree.random_state for tree in snapshot.model.estimators_[:len(base_trees)]], base_trees)
+        changed_through = datetime.fromisoformat(snapshot.metadata['changed_through'])
+        self.assertFalse(SlotBooking.objects.filter(pk__in=[b.pk for b in self.late],
+                                                    updated_at__gt=changed_through).exists())
+
+    def test_small_updates_never_replace_the_base(self):
+        base_trees = [tree.random_state for tree in self.engine.registry.snapshot.model.estimators_]
+        for i in range(40):
+            time.sleep(0.002)
+            seed_bookings(3, 50, seed=10 + i)
+            self.update()
+        model = self.engine.registry.snapshot.model
+        self.assertEqual([tree.random_state for tree in model.estimators_[:len(base_trees)]], base_trees)
+        self.assertLessEqual(len(model.estimators_) - len(base_trees), 120 // 4)
+
+    def test_window_days_must_be_a_positive_integer(self):
+        from django.test import RequestFactory
+
+        from EVStationMaster.views import train_recommendation_model
+
+        for value in ('abc', '-3', '0'):
+            response = train_recommendation_model(RequestFactory().post('/trainModel', {'window_days': value}))
+            self.assertEqual(response.status_code, 400)
+
+
+class RefreshingIndexTests(TestCase):
+    """Rebuilds load off-lock, serve the old data meanwhile and replay concurrent updates"""
+
+    def test_rebuild_keeps_serving_and_replays_updates(self):
+        from EVStationMaster.search import TrigramSearchIndex
+
+        stations = seed_stations(20)
+        renamed = stations[0]
+        during = {}
+
+        def read_and_update(index):
+            during['results'] = index.search('s1', 'name')
+            renamed.stationName = 'Zebra Crossing'
+            index.update(renamed)
+
+        class ObservedIndex(TrigramSearchIndex):
+            def _load(self):
+                fresh = super()._load()
+                if self.built_at is not None:
+                    # Another request arrives while the rebuild holds its loaded data
+                    worker = threading.Thread(target=read_and_update, args=(self,))
+                    worker.start()
+                    worker.join(5)
+                    during['blocked'] = worker.is_alive()
+                return fresh
+
+        index = ObservedIndex(refresh_interval=300)
+        index.build()
+        index.build()
+
+        self.assertFalse(during['blocked'])
+        self.assertEqual(len(during['results']), 11)  # s1, s10..s19 from the old data
+        self.assertEqual(index.search('zebra', 'name'), [renamed.pk])
+        self.assertNotIn(renamed.pk, index.search('s0', 'name'))
+
+
+    def test_stale_index_refreshes_in_the_background(self):
+        from EVStationMaster.refreshing_index import RefreshingIndex
+
+        loading, release = threading.Event(), threading.Event()
+
+        class CountingIndex(RefreshingIndex):
+            data_attributes = ('version',)
+            loads = 0
+
+            def _load(self):
+                CountingIndex.loads += 1
+                if CountingIndex.loads > 1:
+                    loading.set()
+                    release.wait(5)
+                fresh = CountingIndex()
+                fresh.version = CountingIndex.loads
+                return fresh
+
+            def _apply(self, station):
+                pass
+
+        index = CountingIndex(refresh_interval=0)
+        index.ensure_built()  # the first build blocks
+        self.assertEqual(index.version, 1)
+
+        time.sleep(0.01)
+        _, elapsed = timed(index.ensure_built)
+        index.ensure_built()  # a refresh is already running: no second one
+        self.assertLess(elapsed, 1)
+        self.assertTrue(loading.wait(5))
+        self.assertEqual((index.version, CountingIndex.loads), (1, 2))
+
+        release.set()
+        index.refresh_thread.join(5)
+        self.assertEqual(index.version, 2)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor round trips and malformed cursors"""
+
+    def setUp(self):
+        from EVStationMaster.models import SlotBooking
+
+        # Arrival times closer together than a millisecond
+        start = datetime(2024, 1, 1, 10, 0)
+        for i in range(10):
+            SlotBooking.objects.create(stationId=1, customerName='c', vehicleRegistration='v', chargerType='fastCharger',
+                                       arrivalTime=start.replace(microsecond=100 * i + 1), unit=1, time=60, amount=10)
+
+    def pages(self, cursor=None):
+        from EVStationMaster.models import SlotBooking
+        from EVStationMaster.pagination import keyset_page
+
+        return keyset_page(SlotBooking.objects.all(), cursor, 3, ordering=('arrivalTime',))
+
+    def test_walks_every_row_once(self):
+        seen = []
+        cursor = None
+        while True:
+            page = self.pages(cursor)
+            seen += [booking.pk for booking in page.items]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(seen)), 10)
+
+    def test_cursor_of_the_wrong_type_falls_back_to_the_first_page(self):
+        import base64
+        import json
+
+        first = [booking.pk for booking in self.pages().items]
+        for values in (['abc', 5], [[1], 5], [None, 5], ['2024-01-01T10:00:00']):
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            self.assertEqual([booking.pk for booking in self.pages(cursor).items], first)
+        self.assertEqual([booking.pk for booking in self.pages('not a cursor').items], first)
+
+
+def explain(sql):
+    """Query plan text of a captured SQL statement"""
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+class QueryPlanTestCase(TestCase):
+    """Seeds a dataset large enough for the planner to prefer indexes, then checks plans"""
+
+    stations = 2000
+    bookings = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_stations(cls.stations)
+        seed_bookings(cls.bookings, cls.stations, status='Accept')
+        for seed, status in enumerate(['Reject', 'Request Pending', 'Pending'], start=1):
+            seed_bookings(cls.bookings // 10, cls.stations, seed=seed, status=status)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, query, index=None):
+        """Fail if a QuerySet (or captured SQL) scans its table instead of using `index`"""
+        if isinstance(query, QuerySet):
+            table, sql, plan = query.model._meta.db_table, str(query.query), query.explain()
+        else:
+            table, sql, plan = re.search(r'FROM "(\w+)"', query).group(1), query, explain(query)
+        full_scan = re.search(rf'Seq Scan on "?{table}"?|\bSCAN "?{table}"?(?! USING)', plan)
+        self.assertIsNone(full_scan, f"full scan of {table}:\n{sql}\n{plan}")
+        if index is not None:
+            self.assertIn(index, plan, f"{index} not used:\n{sql}\n{plan}")
+
+    def captured_selects(self, view, request, table):
+        """SELECTs on `table` run by a view"""
+        with CaptureQueriesContext(connection) as queries:
+            view(request)
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and f'"{table}"' in query['sql']]
+        self.assertTrue(selects)
+        return selects
+
+
+class BookingHistoryPlanTests(QueryPlanTestCase):
+    """bookingHistory stays on the (stationId, status, arrivalTime) index"""
+
+    def request(self, **params):
+        request = RequestFactory().get('/bookingHistory', dict(params, format='json', page_size=5))
+        request.session = {'username': 'u1', 'stationID': 7}
+        return request
+
+    def test_history_pages_use_the_station_index(self):
+        from EVStationMaster.models import SlotBooking
+        from EVStationMaster.views import bookingHistory
+
+        table = SlotBooking._meta.db_table
+        response = bookingHistory(self.request())
+        cursor = json.loads(response.content)['next_cursor']
+        self.assertIsNotNone(cursor)
+        for params in ({}, {'cursor': cursor}, {'from': '2024-01-01', 'to': '2030-01-01'}):
+            for sql in self.captured_selects(bookingHistory, self.request(**params), table):
+                self.assertUsesIndex(sql, 'booking_station_status_time')
+
+
+class HotQueryPlanTests(QueryPlanTestCase):
+    """The hot view queries stay on their indexes (run against PostgreSQL for the production planner)"""
+
+    def setUp(self):
+        from EVStationMaster.models import SlotBooking, StationDetails
+
+        self.bookings = SlotBooking.objects
+        self.stations = StationDetails.objects
+        self.now = datetime.now()
+
+    def test_station_login(self):
+        self.assertUsesIndex(self.stations.filter(username='u7', password='p', status='Active'), 'station_login')
+
+    def test_station_by_id(self):
+        self.assertUsesIndex(self.stations.filter(stationId=7))
+
+    def test_active_stations_by_pk(self):
+        # views load ranked stations with filter(status='Active').in_bulk(pks)
+        self.assertUsesIndex(self.stations.filter(status='Active', pk__in=[3, 7, 11]))
+
+    def test_user_status(self):
+        self.assertUsesIndex(
+            self.bookings.filter(customerName='c42', vehicleRegistration='MH01'), 'booking_customer_vehicle')
+
+    def test_pending_requests(self):
+        self.assertUsesIndex(
+            self.bookings.filter(status__in=['Pending', 'Request Pending'], stationId=7), 'booking_station_status_time')
+
+    def test_station_schedule(self):
+        from EVStationMaster.availability import HOLDING_STATUSES, MAX_BOOKING
+
+        start = self.now - timedelta(days=1)
+        self.assertUsesIndex(self.bookings.filter(
+            stationId=7, status__in=HOLDING_STATUSES,
+            arrivalTime__gte=start - MAX_BOOKING, arrivalTime__lt=start + timedelta(days=1),
+        ), 'booking_station_status_time')
+
+    def test_daily_occupancy(self):
+        start = self.now - timedelta(days=3)
+        self.assertUsesIndex(self.bookings.filter(
+            status='Accept', arrivalTime__gte=start, arrivalTime__lt=start + timedelta(days=1),
+        ).values('stationId').annotate(total=Count('id')))
+
+    def test_changed_bookings(self):
+        self.assertUsesIndex(
+            self.bookings.filter(status='Accept', updated_at__gt=self.now + timedelta(minutes=1)), 'booking_status_updated')
+
+
+class StationImportTests(TestCase):
+    """Rows that leave columns out get registration defaults or are rejected"""
+
+    def row(self, **fields):
+        return dict(dict(stationName='S', email='s@example.com', username='u', password='p', city='Pune'), **fields)
+
+    def test_new_station_defaults_to_active(self):
+        from EVStationMaster.models import StationDetails
+        from EVStationMaster.station_import import import_stations
+
+        result = import_stations([self.row(stationId=1), self.row(stationId=2, status='')])
+        self.assertEqual(result.as_dict()['created'], 2)
+        self.assertEqual(set(StationDetails.objects.values_list('status', flat=True)), {'Active'})
+
+    def test_update_without_status_keeps_it(self):
+        from EVStationMaster.models import StationDetails
+        from EVStationMaster.station_import import import_stations
+
+        import_stations([self.row(stationId=1, status='Inactive')])
+        result = import_stations([self.row(stationId=1, city='Mumbai')], update_existing=True)
+        self.assertEqual(result.updated, 1)
+        self.assertEqual(StationDetails.objects.values_list('city', 'status').get(), ('Mumbai', 'Inactive'))
+
+    def test_existing_stations_are_skipped_by_default(self):
+        from EVStationMaster.models import StationDetails
+        from EVStationMaster.station_import import import_stations
+
+        import_stations([self.row(stationId=1)])
+        result = import_stations([self.row(stationId=1, password='changed')])
+        self.assertEqual((result.created, result.updated, result.failed), (0, 0, 0))
+        self.assertEqual(StationDetails.objects.get().password, 'p')
+
+    def test_updates_only_need_the_columns_they_change(self):
+        from EVStationMaster.models import StationDetails
+        from EVStationMaster.station_import import import_stations
+
+        import_stations([self.row(stationId=1)])
+        result = import_stations([{'stationId': '1', 'city': 'Mumbai'}, {'stationId': '1', 'email': ''},
+                                  {'stationId': '2', 'city': 'Mumbai'}], update_existing=True)
+        self.assertEqual(result.updated, 1)
+        self.assertEqual([error['row'] for error in result.errors], [2, 3])
+        self.assertEqual(result.errors[0]['errors'], ['email: required'])
+        self.assertEqual(len(result.errors[1]['errors']), 4)  # a new station needs every required column
+        self.assertEqual(StationDetails.objects.values_list('city', 'email').get(), ('Mumbai', 's@example.com'))
+
+    def test_admin_upload_requires_admin_login(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from EVStationMaster.models import StationDetails
+        from EVStationMaster.station_import import import_stations
+        from EVStationMaster.views import adminImportStations
+
+        def upload(session, **fields):
+            feed = b'stationId,stationName,email,username,password,city\n1,S,s@example.com,u,new,Pune\n'
+            request = RequestFactory().post('/adminImportStations', dict(
+                fields, stationFile=SimpleUploadedFile('stations.csv', feed)))
+            request.session = session
+            return adminImportStations(request)
+
+        import_stations([self.row(stationId=1)])
+        self.assertEqual(upload({}).status_code, 403)
+        self.assertEqual(json.loads(upload({'admin': True}).content)['updated'], 0)
+        self.assertEqual(StationDetails.objects.get().password, 'p')
+        self.assertEqual(json.loads(upload({'admin': True}, update_existing='1').content)['updated'], 1)
+        self.assertEqual(StationDetails.objects.get().password, 'new')
+
+    def test_missing_or_blank_email_is_rejected(self):
+        from EVStationMaster.models import StationDetails
+        from EVStationMaster.station_import import import_stations
+
+        missing = self.row()
+        del missing['email']
+        result = import_stations([missing, self.row(email=' ')])
+        self.assertEqual(result.failed, 2)
+        self.assertEqual([error['errors'] for error in result.errors], [['email: required']] * 2)
+        self.assertFalse(StationDetails.objects.exists())
+
+
+class ExportBookingsTests(TestCase):
+    """exportBookings needs a station login and only exports that station's bookings"""
+
+    def request(self, session, **params):
+        request = RequestFactory().get('/exportBookings', params)
+        request.session = session
+        return request
+
+    def test_requires_station_login(self):
+        from EVStationMaster.views import exportBookings
+
+        response = exportBookings(self.request({}, station='1'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_exports_only_the_session_station(self):
+        from EVStationMaster.views import exportBookings
+
+        seed_bookings(200, 5)
+        response = exportBookings(self.request({'username': 'u3', 'stationID': 3}, station='1'))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        station_ids = {line.split(',')[1] for line in lines[1:]}
+        self.assertEqual(station_ids, {'3'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="bookings_3.csv"')
+
+
+@skipUnless(connection.features.has_select_for_update, "needs row locks (run against PostgreSQL)")
+class ParallelAcceptTests(TransactionTestCase):
+    """Concurrent accepts for one charger pool never admit more bookings than it has chargers"""
+
+    capacity = 2
+    requests = 12
+
+    def setUp(self):
+        from EVStationMaster.models import StationDetails
+
+        seed_stations(1)
+        StationDetails.objects.update(fastCharger=self.capacity)
+        arrival = datetime.now().replace(microsecond=0) + timedelta(days=1)
+        self.bookings = seed_bookings(
+            self.requests, 1, status='Request Pending', chargerType='fastCharger', arrivalTime=arrival, time=60)
+
+    def accept(self, booking, barrier, errors):
+        from EVStationMaster.views import updateBookingStatus
+
+        request = RequestFactory().post('/updateBookingStatus', {
+            'slotid': booking.pk, 'ddlstatus': 'Accept', 'txtremark': 'ok'})
+        request.session = {'username': 'u0', 'stationID': 1}
+        try:
+            barrier.wait()
+            updateBookingStatus(request)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_accepts_never_exceed_capacity(self):
+        from EVStationMaster.models import SlotBooking, StationDetails
+
+        barrier = threading.Barrier(self.requests)
+        errors = []
+        threads = [threading.Thread(target=self.accept, args=(booking, barrier, errors)) for booking in self.bookings]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        accepted = SlotBooking.objects.filter(status='Accept').count()
+        self.assertEqual(accepted, self.capacity)
+        self.assertEqual(StationDetails.objects.get().total_bookings, self.capacity)
+
+
+@skipUnless(connection.features.has_select_for_update, "needs row locks (run against PostgreSQL)")
+class ReconcileCountersTests(TransactionTestCase):
+    """reconcile_counters waits for in-flight status changes and counts them"""
+
+    def test_rebuild_waits_for_a_locked_transition(self):
+        from django.db import transaction
+
+        from EVStationMaster.models import SlotBooking, StationDetails, StationOccupancy
+        from EVStationMaster.occupancy import count_accepted_bookings, reconcile_counters
+
+        seed_stations(3)
+        seed_bookings(30, 3)
+        reconcile_counters()
+        pending = seed_bookings(1, 3, seed=1, status='Request Pending')[0]
+        locked, release = threading.Event(), threading.Event()
+
+        def accept():
+            # updateBookingStatus under the station lock, paused inside apply_status_change
+            # between reading the counter and moving it
+            try:
+                with transaction.atomic():
+                    StationDetails.objects.select_for_update().get(stationId=pending.stationId)
+                    SlotBooking.objects.filter(pk=pending.pk).update(status='Accept')
+                    counter, _ = StationOccupancy.objects.get_or_create(
+                        stationId=pending.stationId, day=pending.arrivalTime.date(), chargerType=pending.chargerType)
+                    locked.set()
+                    release.wait(10)
+                    StationOccupancy.objects.filter(pk=counter.pk).update(accepted=F('accepted') + 1)
+            finally:
+                connection.close()
+
+        def reconcile():
+            try:
+                reconcile_counters()
+            finally:
+                connection.close()
+
+        transition = threading.Thread(target=accept)
+        transition.start()
+        self.assertTrue(locked.wait(10))
+        rebuild = threading.Thread(target=reconcile)
+        rebuild.start()
+        rebuild.join(0.5)
+        waited = rebuild.is_alive()
+        release.set()
+        transition.join()
+        rebuild.join()
+
+        day = pending.arrivalTime.date()
+        counters = dict(StationOccupancy.objects.filter(day=day).values_list('stationId').annotate(total=Sum('accepted')))
+        self.assertEqual(counters, count_accepted_bookings(day=day))
+        self.assertTrue(waited)
+
+
+class ApplyStatusChangeTests(TestCase):
+    """Live occupancy counters follow each booking's Accept transitions"""
+
+    def test_counter_follows_transitions(self):
+        from EVStationMaster.models import StationOccupancy
+        from EVStationMaster.occupancy import apply_status_change
+
+        arrival = datetime(2024, 3, 1, 23, 30)
+        first, second, other = seed_bookings(3, 1, chargerType='fastCharger', arrivalTime=arrival)
+        other.chargerType = 'slowcharger'
+        apply_status_change(first, 'Request Pending', 'Reject')
+        self.assertFalse(StationOccupancy.objects.exists())
+        apply_status_change(first, 'Request Pending', 'Accept')
+        apply_status_change(second, 'Request Pending', 'Accept')
+        apply_status_change(other, 'Request Pending', 'Accept')
+        apply_status_change(second, 'Accept', 'Accept')
+        apply_status_change(first, 'Accept', 'Reject')
+        counters = StationOccupancy.objects.order_by('chargerType').values_list('day', 'chargerType', 'accepted')
+        self.assertEqual(list(counters), [(arrival.date(), 'fastCharger', 1), (arrival.date(), 'slowcharger', 1)])
+
+
+@skipUnless(connection.features.has_select_for_update, "needs concurrent writers (run against PostgreSQL)")
+class FirstAcceptOfTheDayTests(TransactionTestCase):
+    """Concurrent first accepts for a station and day share one counter row"""
+
+    requests = 8
+
+    def test_concurrent_first_accepts_create_one_counter(self):
+        from django.db import transaction
+
+        from EVStationMaster.models import StationOccupancy
+        from EVStationMaster.occupancy import apply_status_change
+
+        seed_stations(1)
+        arrival = datetime.now().replace(microsecond=0) + timedelta(days=1)
+        bookings = seed_bookings(self.requests, 1, status='Request Pending', chargerType='fastCharger',
+                                 arrivalTime=arrival)
+        barrier = threading.Barrier(self.requests)
+        errors = []
+
+        def accept(booking):
+            try:
+                with transaction.atomic():
+                    barrier.wait()
+                    apply_status_change(booking, 'Request Pending', 'Accept')
+                    time.sleep(0.2)  # commit only after the other inserts have run into this one
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accept, args=(booking,)) for booking in bookings]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(list(StationOccupancy.objects.values_list('stationId', 'chargerType', 'accepted')),
+                         [(1, 'fastCharger', self.requests)])
+
+
+class StationIdAllocatorTests(TestCase):
+    """stationIds come from the locked counter row, one or many at a time"""
+
+    def setUp(self):
+        from EVStationMaster.models import IdCounter
+
+        seed_stations(3)
+        IdCounter.objects.all().delete()  # first use starts after the existing stations
+
+    def test_single_and_bulk_ids_are_unique_and_contiguous(self):
+        from EVStationMaster.id_allocator import allocate_station_ids
+
+        allocated = allocate_station_ids() + allocate_station_ids(5) + allocate_station_ids() + allocate_station_ids(0)
+        self.assertEqual(allocated, list(range(4, 11)))
+
+    def test_explicit_ids_move_the_counter_forward_only(self):
+        from EVStationMaster.id_allocator import allocate_station_ids, reserve_station_ids_through
+
+        reserve_station_ids_through(20)
+        reserve_station_ids_through(7)
+        self.assertEqual(allocate_station_ids(2), [21, 22])
+
+
+@skipUnless(connection.features.has_select_for_update, "needs row locks (run against PostgreSQL)")
+class ParallelIdAllocationTests(TransactionTestCase):
+    """Concurrent registrations and batch onboarding never share a stationId"""
+
+    threads = 8
+    rounds = 10
+
+    def test_concurrent_allocations_are_unique_and_contiguous(self):
+        from EVStationMaster.id_allocator import allocate_station_ids
+
+        seed_stations(3)
+        barrier = threading.Barrier(self.threads)
+        allocated, errors = [], []
+
+        def allocate(count):
+            try:
+                barrier.wait()
+                for _ in range(self.rounds):
+                    allocated.extend(allocate_station_ids(count))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        # Mixed single and bulk allocations, all racing to create the counter row on first use
+        workers = [threading.Thread(target=allocate, args=(i % 3 * 4 + 1,)) for i in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        total = sum(i % 3 * 4 + 1 for i in range(self.threads)) * self.rounds
+        self.assertEqual(sorted(allocated), list(range(4, 4 + total)))
+
+
+class WaitTimeModelTests(TestCase):
+    """Wait quantiles come from station and time columns only"""
+
+    def setUp(self):
+        from EVStationMaster.views import StationRecommendationEngine
+
+        self.engine = StationRecommendationEngine()
+        self.now = datetime(2024, 1, 15, 18, 30)
+        self.occupancy = OccupancyProvider([])
+        rng = np.random.default_rng(4)
+        features = self.engine.prepare_feature_matrix(station_rows(2000, seed=4), MUMBAI, self.now, None, self.occupancy)
+        features[:, FEATURE_NAMES.index('hour')] = rng.integers(0, 24, len(features))
+        self.wait_model = WaitTimeModel(n_estimators=50).fit(features, rng.gamma(2, 10, len(features)))
+        self.snapshot = ModelSnapshot(None, None, 'test', FEATURE_NAMES, {}, self.wait_model)
+
+    def features(self, n, origin=MUMBAI, preferences=None):
+        return self.engine.prepare_feature_matrix(station_rows(n, seed=5), origin, self.now, preferences, self.occupancy)
+
+    def test_user_columns_do_not_change_predictions(self):
+        near = self.features(300)
+        far = self.features(300, origin=(28.61, 77.21), preferences={'charger_type': 'rapid'})
+        self.assertFalse(np.allclose(near, far))
+        np.testing.assert_array_equal(self.wait_model.predict(near), self.wait_model.predict(far))
+
+    def test_models_fit_on_every_column_use_the_queueing_estimate(self):
+        del self.wait_model.feature_names
+        features = self.features(50)
+        p50, p90 = predict_wait(self.snapshot, features)
+        expected = queueing_wait(features[:, [RAPID, FAST, SLOW]], features[:, OCCUPANCY])
+        np.testing.assert_array_equal(p50, expected[:, 0])
+        np.testing.assert_array_equal(p90, expected[:, -1])
+
+    @skipUnless(RUN_BENCHMARKS, "set EV_BENCHMARKS=1")
+    def test_benchmark_inference_latency(self):
+        fallback = ModelSnapshot(None, None, 'test', FEATURE_NAMES, {})
+        features = self.features(1000)
+        for name, snapshot in (('quantile GBR', self.snapshot), ('queueing', fallback)):
+            predict_wait(snapshot, features)
+            best = min(timed(predict_wait, snapshot, features)[1] for _ in range(20))
+            print(f"\n{name}: {best * 1000:.2f} ms per 1k stations")
+
+
+class PeakHistoryTests(TestCase):
+    """Training peak flags only see demand from before each booking"""
+
+    def setUp(self):
+        seed_stations(2)
+        self.monday = datetime(2024, 1, 1)
+
+    def book(self, when, **fields):
+        return seed_bookings(1, 1, arrivalTime=when, **fields)[0]
+
+    def test_later_demand_does_not_flag_earlier_bookings(self):
+        from EVStationMaster.training_data import build_training_set, training_bookings
+
+        # Station 1 becomes busy at 14:00 from week 2 on
+        for week in range(2, 5):
+            for day in range(5):
+                for _ in range(4):
+                    self.book(self.monday + timedelta(weeks=week, days=day, hours=14), status='Reject')
+        first = self.book(self.monday + timedelta(hours=14), userRemark='good')
+        later = self.book(self.monday + timedelta(weeks=4, days=2, hours=14), userRemark='good')
+        quiet = self.book(self.monday + timedelta(weeks=4, days=2, hours=19), userRemark='good')
+
+        X, _ = build_training_set(training_bookings().filter(pk__in=[first.pk, later.pk, quiet.pk]))
+        self.assertEqual(X[:, FEATURE_NAMES.index('is_peak_hour')].tolist(), [0.0, 1.0, 0.0])
+
+    def test_out_of_order_arrivals_are_rejected(self):
+        from EVStationMaster.forecasting import PeakHistory
+
+        peaks = PeakHistory()
+        peaks.is_peak([1], [self.monday + timedelta(weeks=3)])
+        with self.assertRaises(ValueError):
+            peaks.is_peak([1], [self.monday])
+
+
+class AvailabilityTests(TestCase):
+    """Charger availability from the per-day pool schedules, queried with naive request times"""
+
+    day = datetime(2030, 1, 10)
+
+    def setUp(self):
+        from EVStationMaster.availability import AvailabilityIndex, station_availability
+        from EVStationMaster.models import StationDetails
+
+        seed_stations(1)
+        StationDetails.objects.update(rapidcharger=1, fastCharger=2, slowcharger=0)
+        self.station = StationDetails.objects.get()
+        self.index = AvailabilityIndex()
+        station_availability.invalidate(self.station.stationId)
+        self.book(self.at(10), 'fastCharger', 60, 'Accept')
+        self.book(self.at(10), 'fastCharger', 60, 'Request Pending')
+        self.book(self.at(11), 'fastCharger', 60, 'Reject')
+        self.book(self.at(23), 'rapidcharger', 120, 'Accept')
+
+    def at(self, hour, minute=0, days=0):
+        return self.day + timedelta(days=days, hours=hour, minutes=minute)
+
+    def book(self, when, charger_type, minutes, status):
+        return seed_bookings(1, 1, arrivalTime=booking_time(when), chargerType=charger_type, time=minutes,
+                             status=status)[0]
+
+    def naive(self, when):
+        return timezone.make_naive(when) if timezone.is_aware(when) else when
+
+    def test_is_free(self):
+        free = lambda start, minutes: self.index.is_free(self.station, 'fastCharger', start, minutes)
+        self.assertFalse(free(self.at(10, 30), 30))
+        self.assertFalse(free(self.at(9, 30), 60))
+        self.assertTrue(free(self.at(9), 60))  # ends as the bookings start
+        self.assertTrue(free(self.at(11), 60))  # rejected bookings hold nothing
+        self.assertFalse(self.index.is_free(self.station, 'slowcharger', self.at(12), 30))
+        self.assertFalse(self.index.is_free(self.station, 'unknown', self.at(12), 30))
+
+    def test_free_chargers(self):
+        self.assertEqual(self.index.free_chargers(self.station, 'fast', self.at(9, 59)), 2)
+        self.assertEqual(self.index.free_chargers(self.station, 'fast', self.at(10, 30)), 0)
+        self.assertEqual(self.index.free_chargers(self.station, 'fast', self.at(11)), 2)
+        self.assertEqual(self.index.free_chargers(self.station, 'unknown', self.at(11)), 0)
+
+    def test_next_free_slot(self):
+        found = self.index.next_free_slot(self.station, 'fastCharger', self.at(10), 30)
+        self.assertEqual(self.naive(found), self.at(11))
+        self.assertEqual(self.naive(self.index.next_free_slot(self.station, 'fastCharger', self.at(8), 30)), self.at(8))
+        self.assertIsNone(self.index.next_free_slot(self.station, 'slowcharger', self.at(8), 30))
+
+    def test_slots_crossing_midnight(self):
+        rapid = lambda start, minutes: self.index.is_free(self.station, 'rapidcharger', start, minutes)
+        self.assertFalse(rapid(self.at(22, 30), 60))
+        self.assertFalse(rapid(self.at(0, 30, days=1), 30))
+        self.assertTrue(rapid(self.at(1, days=1), 30))
+        self.assertEqual(self.index.free_chargers(self.station, 'rapidcharger', self.at(0, 30, days=1)), 0)
+        found = self.index.next_free_slot(self.station, 'rapidcharger', self.at(23, 30), 60)
+        self.assertEqual(self.naive(found), self.at(1, days=1))
+
+    def test_has_capacity_for(self):
+        from EVStationMaster.availability import has_capacity_for
+        from EVStationMaster.models import SlotBooking
+
+        request = self.book(self.at(10, 30), 'fastCharger', 30, 'Request Pending')
+        self.assertTrue(has_capacity_for(self.station, request))  # only one of two chargers accepted
+        SlotBooking.objects.filter(status='Request Pending').exclude(pk=request.pk).update(status='Accept')
+        self.assertFalse(has_capacity_for(self.station, request))
+        request.arrivalTime = booking_time(self.at(11))
+        self.assertTrue(has_capacity_for(self.station, request))
+
+    def test_views_accept_form_times(self):
+        from EVStationMaster.models import SlotBooking
+        from EVStationMaster.views import slotAvailability, slotBooking
+
+        response = slotAvailability(RequestFactory().get('/slotAvailability', {
+            'station': self.station.stationId, 'type': 'fastCharger', 'at': '2030-01-10T10:30', 'minutes': 30}))
+        self.assertEqual(json.loads(response.content)['available'], False)
+        self.assertTrue(json.loads(response.content)['next_free_slot'].startswith('2030-01-10T11:00'))
+
+        with mock.patch('EVStationMaster.views.render', return_value=HttpResponse()) as render:
+            slotBooking(RequestFactory().post('/slotBooking', {
+                'txtsID': self.station.stationId, 'txtstation': 's0', 'txtCostomerN': 'new', 'txtregistration': 'MH02',
+                'ddlcharingT': 'fastCharger', 'txtSdate': '2030-01-10', 'txtarrivalT': '12:00',
+                'hfunit': 1, 'hftime': 30, 'hfamount': 10}))
+        self.assertEqual(render.call_args.args[1], 'searchStation.html')
+        booking = SlotBooking.objects.get(customerName='new')
+        self.assertEqual(self.naive(booking.arrivalTime), self.at(12))
+
+
+@override_settings(USE_TZ=True, TIME_ZONE='Asia/Kolkata')
+class AwareAvailabilityTests(AvailabilityTests):
+    """The same queries when stored arrival times come back timezone-aware"""
+
+
+class StationStatsTests(TestCase):
+    """Running rating totals and their rebuild from the bookings"""
+
+    def setUp(self):
+        from EVStationMaster.models import StationDetails
+
+        seed_stations(2)
+        self.station = lambda: StationDetails.objects.get(stationId=1)
+
+    def test_record_rating(self):
+        from EVStationMaster.station_stats import record_rating
+
+        record_rating(1, 0, 4)
+        record_rating(1, None, 5)
+        station = self.station()
+        self.assertEqual((station.rating_sum, station.rating_count, station.average_rating), (9, 2, 4.5))
+
+    def test_changing_a_rating(self):
+        from EVStationMaster.station_stats import record_rating
+
+        record_rating(1, 0, 4)
+        record_rating(1, 0, 2)
+        record_rating(1, 2, 5)  # re-rating moves the sum, not the count
+        record_rating(1, 5, 5)
+        record_rating(1, 5, None)
+        station = self.station()
+        self.assertEqual((station.rating_sum, station.rating_count, station.average_rating), (9, 2, 4.5))
+
+    def test_recompute_station_stats(self):
+        from EVStationMaster.models import StationDetails
+        from EVStationMaster.station_stats import recompute_station_stats
+
+        seed_bookings(3, 1, user_rating=4)
+        seed_bookings(1, 1, user_rating=1, status='Reject')
+        seed_bookings(2, 1, user_rating=0, status='Pending')
+        StationDetails.objects.filter(stationId=1).update(rating_sum=99, rating_count=1, average_rating=99)
+
+        self.assertEqual(recompute_station_stats(), 1)
+        station = self.station()
+        self.assertEqual((station.total_bookings, station.rating_sum, station.rating_count), (3, 13, 4))
+        self.assertEqual(station.average_rating, 13 / 4)
+        self.assertEqual(recompute_station_stats(), 0)
+
+    def test_migration_seeds_totals_from_bookings(self):
+        from importlib import import_module
+
+        from django.apps import apps
+
+        from EVStationMaster.models import StationDetails
+
+        seed_bookings(2, 1, user_rating=5)
+        seed_bookings(1, 1, user_rating=2)
+        seed_bookings(1, 1, user_rating=0)
+        StationDetails.objects.filter(stationId=2).update(average_rating=3.5)
+        import_module('EVStationMaster.migrations.0016_stationdetails_rating_totals').seed_rating_totals(apps, None)
+
+        rated, unrated = StationDetails.objects.order_by('stationId')
+        self.assertEqual((rated.rating_sum, rated.rating_count, rated.average_rating), (12, 3, 4.0))
+        self.assertEqual((unrated.rating_sum, unrated.rating_count, unrated.average_rating), (0, 0, 3.5))
+
+
+class PrefixIndexTests(TestCase):
+    """Typeahead suggestions from the sorted term array"""
+
+    def setUp(self):
+        from EVStationMaster.models import StationDetails
+
+        def station(i, name, city, area='_', status='Active', **landmarks):
+            return StationDetails(stationId=i, stationName=name, email='s@example.com', mobileNo='1', username=f'u{i}',
+                                  password='p', city=city, Area=area, status=status, **landmarks)
+
+        StationDetails.objects.bulk_create([
+            station(1, 'Powai Plaza', 'Mumbai', 'Powai', loc1='Hiranandani Gardens'),
+            station(2, 'Pune Central', 'Pune', 'Shivajinagar', loc1='-'),
+            station(3, 'powai lake charging', 'Mumbai', 'Powai'),
+            station(4, 'Panvel Point', 'Navi Mumbai', status='Inactive'),
+        ])
+
+    def index(self):
+        from EVStationMaster.typeahead import PrefixIndex
+
+        return PrefixIndex()
+
+    def test_prefix_matching_and_case_folding(self):
+        index = self.index()
+        self.assertEqual([r['text'] for r in index.suggest('POW')], ['Powai', 'powai lake charging', 'Powai Plaza'])
+        self.assertEqual(index.suggest('  mum '), [{'text': 'Mumbai', 'type': 'city', 'stations': 2}])
+        self.assertEqual(index.suggest('hira'), [{'text': 'Hiranandani Gardens', 'type': 'landmark', 'stations': 1}])
+        self.assertEqual(index.suggest('powaix'), [])
+        self.assertEqual(index.suggest(''), [])
+
+    def test_ranked_case_insensitively_and_limited(self):
+        index = self.index()
+        self.assertEqual([r['text'] for r in index.suggest('p')],
+                         ['Powai', 'powai lake charging', 'Powai Plaza', 'Pune', 'Pune Central'])
+        self.assertEqual([r['text'] for r in index.suggest('p', limit=2)], ['Powai', 'powai lake charging'])
+
+    def test_skips_inactive_stations_and_placeholders(self):
+        index = self.index()
+        self.assertEqual(index.suggest('panvel'), [])
+        self.assertEqual(index.suggest('navi'), [])
+        self.assertEqual(index.suggest('-'), [])
+
+    def test_updates_apply_to_the_built_index(self):
+        from EVStationMaster.models import StationDetails
+
+        index = self.index()
+        index.suggest('p')
+        station = StationDetails.objects.get(stationId=4)
+        station.status = 'Active'
+        index.update(station)
+        pune = StationDetails.objects.get(stationId=2)
+        pune.status = 'Inactive'
+        index.update(pune)
+        self.assertEqual([r['text'] for r in index.suggest('p')],
+                         ['Panvel Point', 'Powai', 'powai lake charging', 'Powai Plaza'])
+
+    def test_warm_builds_in_the_background(self):
+        from EVStationMaster.refreshing_index import RefreshingIndex
+
+        class FixedIndex(RefreshingIndex):
+            data_attributes = ('terms',)
+
+            def _load(self):
+                fresh = FixedIndex()
+                fresh.terms = ['powai']
+                return fresh
+
+        index = FixedIndex()
+        index.warm()
+        index.refresh_thread.join(5)
+        self.assertEqual(index.terms, ['powai'])
+        self.assertIsNotNone(index.built_at)
+
+    @skipUnless(RUN_BENCHMARKS, "set EV_BENCHMARKS=1")
+    def test_benchmark_build_and_suggest(self):
+        from EVStationMaster.models import StationDetails
+
+        rng = np.random.default_rng(6)
+        words = ['Powai', 'Andheri', 'Bandra', 'Thane', 'Kurla', 'Vashi', 'Borivali', 'Dadar', 'Chembur', 'Malad']
+        for n in (10000, 100000):
+            StationDetails.objects.all().delete()
+            StationDetails.objects.bulk_create([
+                StationDetails(stationId=i + 1, stationName=f'{rng.choice(words)} Station {i}', email='s@example.com',
+                               mobileNo='1', username=f'u{i}', password='p', city=str(rng.choice(words)),
+                               Area=f'{rng.choice(words)} {i % 500}', status='Active', loc1=f'Landmark {i % 2000}')
+                for i in range(n)
+            ], batch_size=5000)
+            index = self.index()
+            _, build = timed(index.build)
+            _, suggest = timed(lambda: [index.suggest(prefix) for prefix in ('p', 'po', 'pow', 'and', 'land')])
+            print(f"\n{n} stations: build {build:.2f} s, suggest {suggest / 5 * 1e6:.0f} us")
+
+
+class RecommendationCacheTests(TestCase):
+    """Cell/time-bucket keys, region invalidation and expiry of cached recommendations"""
+
+    def cache(self, **kwargs):
+        from EVStationMaster.recommendation_cache import RecommendationCache
+
+        return RecommendationCache(**kwargs)
+
+    def lookup(self, cache, point, value='ranked', reach_km=2.0):
+        return cache.get_or_compute(point[0], point[1], 'rapid', 5, 'v1', lambda: value, lambda: reach_km)
+
+    def test_key_buckets_by_cell_preference_and_time(self):
+        from EVStationMaster.recommendation_cache import geohash
+
+        cache = self.cache(bucket_seconds=60)
+        key = cache.key(*MUMBAI, 'rapid', 5, 'v1', now=120)
+        nearby = (MUMBAI[0] + 0.0005, MUMBAI[1] + 0.0005)
+        self.assertEqual(geohash(*nearby), geohash(*MUMBAI))
+        self.assertEqual(cache.key(*nearby, 'rapid', 5, 'v1', now=179.9), key)
+        self.assertNotEqual(cache.key(*MUMBAI, 'rapid', 5, 'v1', now=180), key)
+        self.assertNotEqual(cache.key(MUMBAI[0] + 0.02, MUMBAI[1], 'rapid', 5, 'v1', now=120), key)
+        self.assertNotEqual(cache.key(*MUMBAI, None, 5, 'v1', now=120), key)
+        self.assertNotEqual(cache.key(*MUMBAI, 'rapid', 5, 'v2', now=120), key)
+
+    def test_hits_until_a_nearby_station_changes(self):
+        cache = self.cache()
+        self.assertEqual(self.lookup(cache, MUMBAI, 'first'), 'first')
+        self.assertEqual(self.lookup(cache, MUMBAI, 'second'), 'first')
+        cache.invalidate_near(MUMBAI[0] + 0.5, MUMBAI[1])  # ~55 km away, beyond the 2 km reach
+        self.assertEqual(self.lookup(cache, MUMBAI, 'second'), 'first')
+        cache.invalidate_near(MUMBAI[0] + 0.01, MUMBAI[1] + 0.01)
+        self.assertEqual(self.lookup(cache, MUMBAI, 'second'), 'second')
+        cache.invalidate_all()
+        self.assertEqual(self.lookup(cache, MUMBAI, 'third'), 'third')
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 3, 'hit_rate': 0.4, 'invalidations': 3, 'entries': 1})
+
+    def test_invalidation_covers_the_candidate_reach(self):
+        cache = self.cache()
+        far_station = (MUMBAI[0] + 1.2, MUMBAI[1] - 0.8)  # ~160 km, inside a sparse area's candidate set
+        self.lookup(cache, MUMBAI, 'sparse', reach_km=180.0)
+        cache.invalidate_near(*far_station)
+        self.assertEqual(self.lookup(cache, MUMBAI, 'refreshed', reach_km=180.0), 'refreshed')
+        # Candidates from anywhere (unknown reach) miss on any invalidation
+        cache.get_or_compute(*MUMBAI, None, 5, 'v1', lambda: 'anywhere')
+        cache.invalidate_near(-33.9, 18.4)
+        self.assertEqual(cache.get_or_compute(*MUMBAI, None, 5, 'v1', lambda: 'again'), 'again')
+
+    def test_region_precision_grows_with_reach(self):
+        cache = self.cache()
+        self.assertEqual(cache.region_precision_for(MUMBAI[0], 2.0), 5)
+        self.assertEqual(cache.region_precision_for(MUMBAI[0], 15.0), 4)
+        self.assertEqual(cache.region_precision_for(MUMBAI[0], 180.0), 2)
+        self.assertEqual(cache.region_precision_for(MUMBAI[0], 20000.0), 0)
+        self.assertEqual(cache.region_precision_for(MUMBAI[0], None), 0)
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = self.cache(ttl=60)
+        with mock.patch('EVStationMaster.recommendation_cache.time.monotonic', return_value=1000.0):
+            self.lookup(cache, MUMBAI, 'first')
+        with mock.patch('EVStationMaster.recommendation_cache.time.monotonic', return_value=1059.0):
+            self.assertEqual(self.lookup(cache, MUMBAI, 'second'), 'first')
+        with mock.patch('EVStationMaster.recommendation_cache.time.monotonic', return_value=1061.0):
+            self.assertEqual(self.lookup(cache, MUMBAI, 'second'), 'second')
+
+    def test_counters_are_exact_under_concurrent_lookups(self):
+        cache = self.cache()
+
+        def lookups():
+            for i in range(2000):
+                self.lookup(cache, (MUMBAI[0] + i % 20 * 0.02, MUMBAI[1]))
+
+        threads = [threading.Thread(target=lookups) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 16000)
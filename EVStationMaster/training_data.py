@@ -0,0 +1,131 @@
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from django.db.models import Avg, Q, Sum
+from django.utils import timezone
+
+from EVStationMaster.distance import distance_km
+from EVStationMaster.features import STATION_FEATURE_FIELDS, build_feature_matrix, station_columns
+from EVStationMaster.forecasting import PeakHistory
+from EVStationMaster.models import SlotBooking, StationDetails, StationOccupancy
+
+DEFAULT_USER_LOCATION = (19.0760, 72.8777)  # Mumbai
+
+
+def training_bookings():
+    """Accepted bookings that carry user feedback"""
+    return SlotBooking.objects.filter(
+        status__in=['Accept'],
+        userRemark__isnull=False
+    ).exclude(userRemark='-')
+
+
+def wait_time_bookings():
+    """Accepted bookings with an observed wait: recorded directly or implied by completion_time"""
+    return SlotBooking.objects.filter(status='Accept').filter(
+        Q(wait_time_actual__gt=0) | Q(completion_time__isnull=False)
+    )
+
+
+def service_minutes_by_type():
+    """Mean booked charging time per chargerType over accepted bookings"""
+    rows = SlotBooking.objects.filter(status='Accept', time__gt=0).values('chargerType').annotate(
+        minutes=Avg('time')
+    ).values_list('chargerType', 'minutes')
+    return {charger_type: float(minutes) for charger_type, minutes in rows}
+
+
+def historical_occupancy():
+    """Accepted bookings per (stationId, day) over the whole history, from the occupancy counters"""
+    rows = StationOccupancy.objects.filter(accepted__gt=0).values('stationId', 'day').annotate(
+        total=Sum('accepted')
+    ).values_list('stationId', 'day', 'total')
+    return {(station_id, day): total for station_id, day, total in rows}
+
+
+def target_scores(remarks):
+    """Target score from the user remark text, vectorized over a Series"""
+    remarks = remarks.str.lower()
+    scores = np.full(len(remarks), 3.0)  # Base score
+    bad = remarks.str.contains('bad') | remarks.str.contains('poor')
+    good = remarks.str.contains('good') | remarks.str.contains('excellent')
+    scores[bad.to_numpy()] = 2.0
+    scores[good.to_numpy()] = 4.5
+    return scores
+
+
+def remark_targets(frame):
+    return target_scores(frame['userRemark'])
+
+
+def wait_targets(frame):
+    """Wait minutes: wait_time_actual, or completion minus arrival minus charging time"""
+    recorded = frame['wait_time_actual'].astype(float).to_numpy()
+    elapsed = (pd.to_datetime(frame['completion_time']) - pd.to_datetime(frame['arrivalTime'])).dt.total_seconds()
+    implied = (elapsed.to_numpy() / 60 - frame['time'].astype(float).to_numpy())
+    return np.where(recorded > 0, recorded, np.clip(np.nan_to_num(implied), 0, None))
+
+
+def _local(value):
+    return timezone.localtime(value) if timezone.is_aware(value) else value
+
+
+def build_training_set(bookings=None, user_location=DEFAULT_USER_LOCATION, distance_method='haversine',
+                       chunk_size=10000, progress=None, target_fields=('userRemark',), targets=remark_targets):
+    """Build (X, y) from bookings joined to stations, streamed in chunks in arrival order
+
+    targets(frame) maps a chunk with the target_fields columns to y. is_peak_hour comes
+    from a forecast replayed up to each booking, not the latest one, so it does not leak
+    later demand into training rows.
+    """
+    if bookings is None:
+        bookings = training_bookings()
+
+    # Stations in one query, joined to bookings through a dict lookup
+    stations = {}
+    for row in StationDetails.objects.values_list(*STATION_FEATURE_FIELDS):
+        stations[row[0]] = row
+    occupancy = historical_occupancy()
+    peaks = PeakHistory()
+
+    total = bookings.count()
+    X_chunks = []
+    y_chunks = []
+    done = 0
+    fields = ['stationId', 'arrivalTime'] + [field for field in target_fields if field != 'arrivalTime']
+    rows = bookings.order_by('arrivalTime', 'id').values_list(*fields).iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        done += len(chunk)
+
+        frame = pd.DataFrame(chunk, columns=fields)
+        frame = frame[frame['stationId'].isin(list(stations))]
+        if len(frame):
+            arrivals = [_local(value) for value in frame['arrivalTime']]
+            columns = station_columns([stations[station_id] for station_id in frame['stationId']])
+            counts = np.fromiter(
+                (occupancy.get((station_id, arrival.date()), 0)
+                 for station_id, arrival in zip(frame['stationId'], arrivals)),
+                dtype=float, count=len(frame)
+            )
+            distance = distance_km(user_location[0], user_location[1], columns[:, 8], columns[:, 9], distance_method)
+            hours = [arrival.hour for arrival in arrivals]
+            X_chunks.append(build_feature_matrix(
+                columns, counts, distance,
+                hours,
+                [arrival.weekday() for arrival in arrivals],
+                0,
+                peaks.is_peak(frame['stationId'].to_numpy(), arrivals)
+            ))
+            y_chunks.append(targets(frame))
+
+        if progress is not None:
+            progress(0.8 * done / max(total, 1), f"Preparing features ({done}/{total})")
+
+    if not X_chunks:
+        return np.zeros((0, 14)), np.zeros(0)
+    return np.vstack(X_chunks), np.concatenate(y_chunks)
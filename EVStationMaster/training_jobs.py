@@ -0,0 +1,123 @@
+import fcntl
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+STATUS_FILE = 'training_status.json'
+LOCK_FILE = '.training.lock'
+
+
+def read_status(root):
+    """Last known training job status, shared by all workers through the store root"""
+    try:
+        with open(os.path.join(root, STATUS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'state': 'idle', 'progress': 0.0, 'message': ''}
+
+
+def write_status(root, **fields):
+    os.makedirs(root, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=root, prefix='.status-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(dict(fields, updated_at=datetime.now().isoformat()), f)
+    os.replace(tmp_path, os.path.join(root, STATUS_FILE))
+
+
+def _acquire_lock(root, blocking=False):
+    """Exclusive lock held for the duration of a training job"""
+    os.makedirs(root, exist_ok=True)
+    lock_file = open(os.path.join(root, LOCK_FILE), 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _run_training(root, job_id, mode='full', window_days=None):
+    """Runs in the pool process; jobs from other workers wait on the lock"""
+    lock_file = _acquire_lock(root, blocking=True)
+
+    from EVStationMaster.views import recommendation_engine
+
+    started_at = datetime.now().isoformat()
+
+    def progress(fraction, message):
+        write_status(root, job_id=job_id, mode=mode, state='running', progress=round(fraction, 3),
+                     message=message, started_at=started_at)
+
+    try:
+        success = recommendation_engine.train_model(progress=progress, mode=mode, window_days=window_days)
+        if success:
+            write_status(root, job_id=job_id, mode=mode, state='succeeded', progress=1.0, started_at=started_at,
+                         finished_at=datetime.now().isoformat(),
+                         message="Recommendation model trained successfully!",
+                         version=recommendation_engine.registry.snapshot.version)
+        else:
+            if mode == 'incremental':
+                message = "No new bookings with user feedback since the last training."
+            else:
+                message = "Not enough data to train the model. Need at least 5 bookings with user feedback."
+            write_status(root, job_id=job_id, mode=mode, state='failed', progress=1.0, started_at=started_at,
+                         finished_at=datetime.now().isoformat(), message=message)
+        return success
+    except Exception as e:
+        write_status(root, job_id=job_id, mode=mode, state='failed', progress=1.0, started_at=started_at,
+                     finished_at=datetime.now().isoformat(), message=f"Training failed: {e}")
+        return False
+    finally:
+        lock_file.close()
+
+
+class TrainingJobRunner:
+    """Queues model training onto a single-process pool, one job at a time"""
+
+    def __init__(self, root):
+        self.root = root
+        self.executor = None
+        self.future = None
+        self.lock = threading.Lock()
+
+    def _get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+        return self.executor
+
+    def is_running(self):
+        """True if a job is queued here or another process holds the training lock"""
+        if self.future is not None and not self.future.done():
+            return True
+        lock_file = _acquire_lock(self.root)
+        if lock_file is None:
+            return True
+        lock_file.close()
+        return False
+
+    def submit(self, mode='full', window_days=None):
+        """Enqueue a training job and return its id, or None if one is already running"""
+        with self.lock:
+            if self.is_running():
+                return None
+            job_id = uuid.uuid4().hex
+            write_status(self.root, job_id=job_id, state='queued', mode=mode, progress=0.0, message="Waiting to start")
+            self.future = self._get_executor().submit(_run_training, self.root, job_id, mode, window_days)
+            return job_id
+
+    def status(self):
+        return read_status(self.root)
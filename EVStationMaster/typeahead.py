@@ -0,0 +1,93 @@
+from bisect import bisect_left, insort
+
+from EVStationMaster.refreshing_index import RefreshingIndex
+
+# Station fields offered as suggestions, and the type reported for each
+SUGGESTION_FIELDS = (
+    ('stationName', 'station'),
+    ('city', 'city'),
+    ('Area', 'area'),
+    ('loc1', 'landmark'), ('loc2', 'landmark'), ('loc3', 'landmark'),
+    ('loc4', 'landmark'), ('loc5', 'landmark'), ('loc6', 'landmark'),
+)
+
+PLACEHOLDERS = {'', '_', '-'}
+
+
+class PrefixIndex(RefreshingIndex):
+    """Sorted array of suggestion terms over active stations, searched with bisect"""
+
+    data_attributes = ('keys', 'stations', 'station_keys')
+
+    def __init__(self, refresh_interval=300):
+        super().__init__(refresh_interval)
+        self.keys = []  # sorted (normalized, type, display)
+        self.stations = {}  # key -> set of station pks
+        self.station_keys = {}  # pk -> keys contributed by that station
+
+    def _terms(self, station):
+        keys = set()
+        for field, kind in SUGGESTION_FIELDS:
+            display = (getattr(station, field) or '').strip()
+            if display not in PLACEHOLDERS:
+                keys.add((display.casefold(), kind, display))
+        return keys
+
+    def _insert(self, pk, keys, presorted=False):
+        self.station_keys[pk] = keys
+        for key in keys:
+            members = self.stations.get(key)
+            if members is None:
+                self.stations[key] = members = set()
+                if not presorted:
+                    insort(self.keys, key)
+            members.add(pk)
+
+    def _remove(self, pk):
+        for key in self.station_keys.pop(pk, ()):
+            members = self.stations.get(key)
+            if members is None:
+                continue
+            members.discard(pk)
+            if not members:
+                del self.stations[key]
+                i = bisect_left(self.keys, key)
+                if i < len(self.keys) and self.keys[i] == key:
+                    del self.keys[i]
+
+    def _load(self):
+        """A new index of all active stations"""
+        from EVStationMaster.models import StationDetails
+
+        fields = [field for field, _ in SUGGESTION_FIELDS]
+        fresh = PrefixIndex()
+        for station in StationDetails.objects.filter(status='Active').only('pk', *fields).iterator():
+            fresh._insert(station.pk, fresh._terms(station), presorted=True)
+        fresh.keys = sorted(fresh.stations)
+        return fresh
+
+    def _apply(self, station):
+        """Re-index a station's terms"""
+        self._remove(station.pk)
+        if station.status == 'Active':
+            self._insert(station.pk, self._terms(station))
+
+    def suggest(self, prefix, limit=10):
+        """Up to `limit` terms starting with prefix, alphabetically"""
+        self.ensure_built()
+        prefix = (prefix or '').strip().casefold()
+        if not prefix:
+            return []
+        results = []
+        with self.lock:
+            i = bisect_left(self.keys, (prefix,))
+            while i < len(self.keys) and len(results) < limit:
+                normalized, kind, display = self.keys[i]
+                if not normalized.startswith(prefix):
+                    break
+                results.append({'text': display, 'type': kind, 'stations': len(self.stations[self.keys[i]])})
+                i += 1
+        return results
+
+
+station_typeahead = PrefixIndex()
@@ -13,7 +13,9 @@ urlpatterns = [
     path('stationBooking', views.stationBooking, name='stationBooking'),
     path('searchStation', views.searchStation, name='searchStation'),
     path('viewStation', views.viewStation, name='viewStation'),
+    path('stationTypeahead', views.stationTypeahead, name='stationTypeahead'),
     path('slotBooking', views.slotBooking, name='slotBooking'),
+    path('slotAvailability', views.slotAvailability, name='slotAvailability'),
     path('userStatus', views.userStatus, name='userStatus'),
     path('updateBookingStatus', views.updateBookingStatus, name='updateBookingStatus'),
     path('bookingHistory', views.bookingHistory, name='bookingHistory'),
@@ -22,7 +24,12 @@ urlpatterns = [
     path('adminDefault', views.adminDefault, name='adminDefault'),
     path('adminMaster', views.adminMaster, name='adminMaster'),
     path('stationList', views.stationList, name='stationList'),
+    path('adminImportStations', views.adminImportStations, name='adminImportStations'),
+    path('exportBookings', views.exportBookings, name='exportBookings'),
     path('change_status/<int:station_id>/', views.change_status, name='change_status'),
+    path('trainModel', views.train_recommendation_model, name='trainModel'),
+    path('trainModelStatus', views.train_recommendation_model_status, name='trainModelStatus'),
+    path('recommendationCacheStats', views.recommendation_cache_stats, name='recommendationCacheStats'),
 
 
 ]
@@ -2,228 +2,293 @@
 from django.shortcuts import render,redirect,HttpResponse
 from django.core.exceptions import ObjectDoesNotExist
 from EVStationMaster.models import StationDetails, SlotBooking
+from EVStationMaster.occupancy import OccupancyProvider, apply_status_change, booking_time
+from EVStationMaster.station_stats import parse_rating, record_rating, record_status_change
+from EVStationMaster.distance import distance_km
+from EVStationMaster.spatial_index import station_index
+from EVStationMaster.feature_store import station_features
+from EVStationMaster.search import search_stations, station_search
+from EVStationMaster.typeahead import station_typeahead
+from EVStationMaster.availability import has_capacity_for, station_availability
+from EVStationMaster.recommendation_cache import cache_from_settings
+from EVStationMaster.pagination import keyset_page, page_size_from
+from EVStationMaster.exports import BOOKING_EXPORT_FIELDS, booking_export_queryset, stream_csv, stream_parquet, pq
+from EVStationMaster.id_allocator import allocate_station_ids
+from EVStationMaster.station_import import import_stations, iter_csv, iter_json
+from EVStationMaster.model_registry import ModelRegistry
+from EVStationMaster.model_store import ModelArtifactStore
+from EVStationMaster.training_jobs import TrainingJobRunner
+from EVStationMaster.training_data import (
+    build_training_set, service_minutes_by_type, training_bookings, wait_targets, wait_time_bookings
+)
+from EVStationMaster.forecasting import demand_forecast
+from EVStationMaster.wait_time import WaitTimeModel, predict_wait, queueing_wait, wait_minutes_display
+from EVStationMaster.features import (
+    FEATURE_NAMES, build_feature_matrix, station_columns
+)
 from django.contrib import messages
-from django.db import connection
-from datetime import datetime
-from django.db.models import Q, Avg
+from django.db import transaction
+from datetime import datetime, timedelta
+from django.db.models import Max
+from django.utils import timezone
 from django.urls import reverse
 from django.http import JsonResponse
-import json
+import copy
+import io
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
-import joblib
-import pickle
-import os
 
 # Add this class to your existing code
 class StationRecommendationEngine:
     """ML-based recommendation engine for EV stations"""
     
     def __init__(self):
-        self.model = None
-        self.scaler = StandardScaler()
-        self.is_trained = False
-        self.model_path = 'station_recommendation_model.pkl'
-        self.scaler_path = 'feature_scaler.pkl'
+        self.candidate_limit = 200  # nearest stations scored per request
+        self.n_estimators = 50
+        self.incremental_estimators = 10  # trees added per incremental update
+        self.max_estimators = 200  # oldest trees are dropped beyond this
+        self.min_wait_samples = 50  # bookings with observed waits needed to fit the wait model
+        self.distance_method = 'haversine'  # or 'equirectangular' for short ranges
+        self.registry = ModelRegistry(ModelArtifactStore(keep=5))
+        self.registry.reload()  # Load once at worker startup
+
+    @property
+    def is_trained(self):
+        return self.registry.snapshot is not None
     
-    def prepare_features(self, station, user_location, current_time, user_preferences=None):
-        """Prepare feature vector for ML model"""
-        try:
-            features = []
-            
-            # Station features
-            features.extend([
-                float(station.rapidcharger or 0),
-                float(station.fastCharger or 0),
-                float(station.slowcharger or 0),
-                float(station.Pspaces or 0),
-                float(getattr(station, 'average_rating', 0)),
-                float(getattr(station, 'total_bookings', 0)),
-                float(getattr(station, 'amenities_score', 0)),
-                self.get_current_occupancy_rate(station)
-            ])
-            
-            # Distance feature (simplified calculation)
-            station_lat = getattr(station, 'latitude', 19.0760)  # Default Mumbai lat
-            station_lng = getattr(station, 'longitude', 72.8777)  # Default Mumbai lng
-            distance = abs(station_lat - user_location[0]) + abs(station_lng - user_location[1])
-            features.append(distance)
-            
-            # Time-based features
-            hour = current_time.hour
-            day_of_week = current_time.weekday()
-            is_weekend = 1 if day_of_week >= 5 else 0
-            is_peak_hour = 1 if hour in [9, 10, 11, 18, 19, 20] else 0
-            
-            features.extend([hour, day_of_week, is_weekend, is_peak_hour])
-            
-            # User preference features
-            if user_preferences:
-                charger_pref = 1 if user_preferences.get('charger_type') == 'rapid' else 0
-                features.append(charger_pref)
-            else:
-                features.append(0)
-            
-            return np.array(features).reshape(1, -1)
-        except Exception as e:
-            print(f"Error in prepare_features: {e}")
-            # Return default feature vector
-            return np.zeros((1, 14))
-    
-    def get_current_occupancy_rate(self, station):
+    def prepare_feature_matrix(self, rows, user_location, current_time, user_preferences=None, occupancy=None):
+        """Prepare an N x 14 feature matrix from STATION_FEATURE_FIELDS rows"""
+        columns = station_columns(rows)
+        station_ids = columns[:, 0].astype(int).tolist()
+        n = len(columns)
+
+        # Occupancy from the preloaded per-station counts
+        if occupancy is None:
+            occupancy = OccupancyProvider(station_ids)
+        counts = np.fromiter((occupancy.get_count(sid) for sid in station_ids), dtype=float, count=n)
+
+        distance = distance_km(user_location[0], user_location[1], columns[:, 8], columns[:, 9], self.distance_method)
+
+        # Time-based features are the same for every station
+        charger_pref = 1 if user_preferences and user_preferences.get('charger_type') == 'rapid' else 0
+
+        # Peak hours come from each station's demand forecast
+        return build_feature_matrix(
+            columns, counts, distance,
+            np.full(n, current_time.hour), np.full(n, current_time.weekday()), charger_pref,
+            demand_forecast.is_peak(station_ids, current_time.hour)
+        )
+
+    def score_stations(self, snapshot, rows, user_location, current_time, user_preferences=None, occupancy=None):
+        """Score all candidate rows with a single transform/predict call"""
+        features = self.prepare_feature_matrix(rows, user_location, current_time, user_preferences, occupancy)
+        if len(features) == 0:
+            return features, np.zeros(0)
+        scores = snapshot.model.predict(snapshot.scaler.transform(features))
+        return features, np.maximum(0, scores)  # Ensure non-negative score
+
+    def get_candidate_stations(self, user_location):
+        """Active stations nearest to the user, pruned through the spatial index"""
+        candidates = station_index.nearest(user_location[0], user_location[1], k=self.candidate_limit)
+        return StationDetails.objects.filter(status='Active', pk__in=candidates)
+
+    def get_current_occupancy_rate(self, station, occupancy=None):
         """Calculate current occupancy rate"""
         try:
-            from django.utils import timezone
-            now = timezone.now()
-            current_bookings = SlotBooking.objects.filter(
-                stationId=station.stationId,
-                arrivalTime__date=now.date(),
-                status='Accept'
-            ).count()
-            total_capacity = (station.rapidcharger or 0) + (station.fastCharger or 0) + (station.slowcharger or 0)
-            if total_capacity == 0:
-                return 0
-            return (current_bookings / total_capacity) * 100
+            if occupancy is None:
+                occupancy = OccupancyProvider([station.stationId])
+            return occupancy.get_rate(station)
         except:
             return 0
     
-    def train_model(self):
+    def train_model(self, progress=None, mode='full', window_days=None):
         """Train the recommendation model using historical data"""
+        # 'incremental' adds trees for bookings past the last watermark;
+        # window_days keeps a full retrain to recent bookings only
+        if progress is None:
+            progress = lambda fraction, message: None
+        if mode == 'incremental':
+            return self.update_model(progress)
         try:
+            progress(0.0, "Loading bookings")
             # Get training data from bookings with ratings
-            bookings = SlotBooking.objects.filter(
-                status__in=['Accept'],
-                userRemark__isnull=False
-            ).exclude(userRemark='-')
+            bookings = training_bookings()
+            if window_days:
+                bookings = bookings.filter(arrivalTime__gte=timezone.now() - timedelta(days=window_days))
+            # Bookings changed after this point are left for the next incremental update
+            changed_through = bookings.aggregate(last=Max('updated_at'))['last']
+            if changed_through is not None:
+                bookings = bookings.filter(updated_at__lte=changed_through)
             
-            if len(bookings) < 5:  # Not enough data
+            if bookings.count() < 5:  # Not enough data
                 return False
             
-            X = []
-            y = []
-            
-            for booking in bookings:
-                try:
-                    station = StationDetails.objects.get(stationId=booking.stationId)
-                    user_location = [19.0760, 72.8777]  # Default location
-                    
-                    features = self.prepare_features(
-                        station, 
-                        user_location, 
-                        booking.arrivalTime
-                    )
-                    
-                    # Create target score based on booking success and user remarks
-                    target_score = 3.0  # Base score
-                    if 'good' in booking.userRemark.lower() or 'excellent' in booking.userRemark.lower():
-                        target_score = 4.5
-                    elif 'bad' in booking.userRemark.lower() or 'poor' in booking.userRemark.lower():
-                        target_score = 2.0
-                    
-                    X.append(features.flatten())
-                    y.append(target_score)
-                    
-                except StationDetails.DoesNotExist:
-                    continue
-                except Exception as e:
-                    print(f"Error processing booking {booking.id}: {e}")
-                    continue
+            X, y = build_training_set(
+                bookings,
+                distance_method=self.distance_method,
+                progress=progress
+            )
             
             if len(X) < 3:
                 return False
             
-            X = np.array(X)
-            y = np.array(y)
+            progress(0.8, "Fitting model")
             
-            # Scale features
-            X_scaled = self.scaler.fit_transform(X)
+            # Scale features with a fresh scaler so live scoring is untouched
+            scaler = StandardScaler()
+            X_scaled = scaler.fit_transform(X)
             
             # Train Random Forest model
-            self.model = RandomForestRegressor(
-                n_estimators=50,
+            model = RandomForestRegressor(
+                n_estimators=self.n_estimators,
                 max_depth=10,
                 random_state=42
             )
-            self.model.fit(X_scaled, y)
-            self.is_trained = True
+            model.fit(X_scaled, y)
             
-            # Save model
-            try:
-                joblib.dump(self.model, self.model_path)
-                joblib.dump(self.scaler, self.scaler_path)
-            except:
-                # Fallback to pickle if joblib fails
-                with open(self.model_path, 'wb') as f:
-                    pickle.dump(self.model, f)
-                with open(self.scaler_path, 'wb') as f:
-                    pickle.dump(self.scaler, f)
+            progress(0.9, "Fitting wait-time model")
+            wait_model = self.train_wait_model(window_days)
             
+            progress(0.95, "Saving model")
+            
+            # Save as a new version; other workers pick it up through their registry
+            self.registry.publish(model, scaler, FEATURE_NAMES, {
+                'trained_at': datetime.now().isoformat(),
+                'n_samples': len(X),
+                'n_estimators': model.n_estimators,
+                'base_samples': len(X),
+                'base_estimators': model.n_estimators,
+                'changed_through': changed_through.isoformat(),
+                'window_days': window_days,
+                'service_minutes': service_minutes_by_type(),
+            }, wait_model=wait_model)
             return True
             
         except Exception as e:
             print(f"Error in train_model: {e}")
             return False
     
-    def load_model(self):
-        """Load pre-trained model"""
+    def update_model(self, progress):
+        """Warm-start the current forest with trees fit on bookings changed since the watermark"""
         try:
-            if os.path.exists(self.model_path) and os.path.exists(self.scaler_path):
-                try:
-                    self.model = joblib.load(self.model_path)
-                    self.scaler = joblib.load(self.scaler_path)
-                except:
-                    # Fallback to pickle
-                    with open(self.model_path, 'rb') as f:
-                        self.model = pickle.load(f)
-                    with open(self.scaler_path, 'rb') as f:
-                        self.scaler = pickle.load(f)
-                
-                self.is_trained = True
-                return True
+            snapshot = self.registry.reload()
+            if snapshot is None or tuple(snapshot.feature_schema or ()) != FEATURE_NAMES:
+                return False
+            metadata = snapshot.metadata
+            if not metadata.get('changed_through'):
+                # Bundles from before change watermarks need one full retrain
+                return self.train_model(progress, window_days=metadata.get('window_days'))
+            
+            progress(0.0, "Loading changed bookings")
+            # updated_at moves when a booking is accepted or gets a remark, so older
+            # bookings that only just became trainable are picked up too
+            bookings = training_bookings().filter(updated_at__gt=datetime.fromisoformat(metadata['changed_through']))
+            changed_through = bookings.aggregate(last=Max('updated_at'))['last']
+            if changed_through is None:
+                return False
+            bookings = bookings.filter(updated_at__lte=changed_through)
+            
+            # Each tree gets as many samples as a tree of the full-history base, so small
+            # increments wait for more bookings instead of outweighing the base
+            base_estimators = metadata.get('base_estimators') or len(snapshot.model.estimators_)
+            samples_per_tree = max(1, (metadata.get('base_samples') or metadata.get('n_samples', 0)) // base_estimators)
+            if bookings.count() < samples_per_tree:
+                return False
+            
+            X, y = build_training_set(bookings, distance_method=self.distance_method, progress=progress)
+            added = min(self.incremental_estimators, len(X) // samples_per_tree)
+            if len(X) < 3 or added == 0:
+                return False
+            
+            progress(0.8, "Adding trees")
+            
+            # Copy so requests scoring with the live snapshot are untouched;
+            # the scaler stays fixed because existing trees split on its output
+            model = copy.deepcopy(snapshot.model)
+            model.set_params(warm_start=True, n_estimators=len(model.estimators_) + added)
+            model.fit(snapshot.scaler.transform(X), y)
+            
+            # Sliding window over the incremental trees only; the full-history base is always kept
+            limit = max(self.max_estimators, base_estimators + self.incremental_estimators)
+            if len(model.estimators_) > limit:
+                model.estimators_ = model.estimators_[:base_estimators] + model.estimators_[base_estimators - limit:]
+                model.set_params(n_estimators=limit)
+            
+            progress(0.95, "Saving model")
+            self.registry.publish(model, snapshot.scaler, FEATURE_NAMES, dict(
+                metadata,
+                trained_at=datetime.now().isoformat(),
+                n_samples=metadata.get('n_samples', 0) + len(X),
+                n_estimators=model.n_estimators,
+                base_estimators=base_estimators,
+                changed_through=changed_through.isoformat(),
+            ), wait_model=snapshot.wait_model)
+            return True
+            
         except Exception as e:
-            print(f"Error loading model: {e}")
-        return False
+            print(f"Error in update_model: {e}")
+            return False
+    
+    def train_wait_model(self, window_days=None):
+        """Quantile wait-time model on bookings with an observed wait, or None if there are too few"""
+        bookings = wait_time_bookings()
+        if window_days:
+            bookings = bookings.filter(arrivalTime__gte=timezone.now() - timedelta(days=window_days))
+        if bookings.count() < self.min_wait_samples:
+            return None
+        X, y = build_training_set(
+            bookings,
+            distance_method=self.distance_method,
+            target_fields=('wait_time_actual', 'completion_time', 'time'),
+            targets=wait_targets
+        )
+        if len(X) < self.min_wait_samples:
+            return None
+        return WaitTimeModel().fit(X, y)
     
     def get_recommendations(self, user_location, user_preferences=None, limit=5):
         """Get station recommendations for a user"""
-        if not self.is_trained and not self.load_model():
+        snapshot = self.registry.get()
+        if snapshot is None or tuple(snapshot.feature_schema or ()) != FEATURE_NAMES:
             # Fallback to rule-based recommendations
             return self.get_rule_based_recommendations(user_location, limit)
         
         try:
-            stations = StationDetails.objects.filter(status='Active')
+            # Static station features come from the in-process feature store;
+            # only occupancy, distance and time are computed per request
+            candidates = station_index.nearest(user_location[0], user_location[1], k=self.candidate_limit)
+            pks, columns = station_features.get_rows(candidates)
             current_time = datetime.now()
+            occupancy = OccupancyProvider(columns[:, 0].astype(int).tolist())
             
-            station_scores = []
+            features, scores = self.score_stations(
+                snapshot,
+                columns,
+                user_location,
+                current_time,
+                user_preferences,
+                occupancy
+            )
             
-            for station in stations:
-                try:
-                    features = self.prepare_features(
-                        station, 
-                        user_location, 
-                        current_time, 
-                        user_preferences
-                    )
-                    
-                    features_scaled = self.scaler.transform(features)
-                    predicted_score = self.model.predict(features_scaled)[0]
-                    
-                    station_scores.append({
-                        'station': station,
-                        'score': max(0, predicted_score),  # Ensure non-negative score
-                        'predicted_wait_time': max(1, int(self.get_current_occupancy_rate(station) / 10)),
-                        'distance': abs(getattr(station, 'latitude', 19.0760) - user_location[0]) + 
-                                   abs(getattr(station, 'longitude', 72.8777) - user_location[1])
-                    })
-                    
-                except Exception as e:
-                    print(f"Error processing station {station.stationId}: {e}")
+            # Stable sort keeps candidate order for equal scores
+            top = np.argsort(-scores, kind='stable')[:limit]
+            wait_p50, wait_p90 = predict_wait(snapshot, features[top])
+            stations = StationDetails.objects.filter(status='Active').in_bulk([pks[i] for i in top])
+            
+            station_scores = []
+            for rank, i in enumerate(top):
+                if pks[i] not in stations:
                     continue
+                station_scores.append({
+                    'station': stations[pks[i]],
+                    'score': scores[i],
+                    'predicted_wait_time': wait_minutes_display(wait_p50[rank]),
+                    'wait_time_p90': wait_minutes_display(wait_p90[rank]),
+                    'distance': features[i, 8]
+                })
             
-            # Sort by score and return top recommendations
-            station_scores.sort(key=lambda x: x['score'], reverse=True)
-            return station_scores[:limit]
+            return station_scores
             
         except Exception as e:
             print(f"Error in get_recommendations: {e}")
@@ -232,15 +297,26 @@ class StationRecommendationEngine:
     def get_rule_based_recommendations(self, user_location, limit=5):
         """Fallback rule-based recommendations"""
         try:
-            stations = StationDetails.objects.filter(status='Active')
+            stations = list(self.get_candidate_stations(user_location))
+            occupancy = OccupancyProvider([station.stationId for station in stations])
+            snapshot = self.registry.snapshot
+            waits = queueing_wait(
+                [(station.rapidcharger or 0, station.fastCharger or 0, station.slowcharger or 0) for station in stations],
+                [self.get_current_occupancy_rate(station, occupancy) for station in stations],
+                snapshot.metadata.get('service_minutes') if snapshot else None
+            )
             
             station_scores = []
             
-            for station in stations:
+            for station, (wait_p50, wait_p90) in zip(stations, waits):
                 # Simple scoring based on distance, availability, and features
-                distance = abs(getattr(station, 'latitude', 19.0760) - user_location[0]) + \
-                          abs(getattr(station, 'longitude', 72.8777) - user_location[1])
-                availability_score = 100 - self.get_current_occupancy_rate(station)
+                distance = float(distance_km(
+                    user_location[0], user_location[1],
+                    getattr(station, 'latitude', 19.0760), getattr(station, 'longitude', 72.8777),
+                    self.distance_method
+                ))
+                occupancy_rate = self.get_current_occupancy_rate(station, occupancy)
+                availability_score = 100 - occupancy_rate
                 capacity_score = (station.rapidcharger or 0) + (station.fastCharger or 0) + (station.slowcharger or 0)
                 
                 total_score = (availability_score * 0.4) + (capacity_score * 0.3) + (1/max(distance, 0.1) * 0.3)
@@ -248,7 +324,8 @@ class StationRecommendationEngine:
                 station_scores.append({
                     'station': station,
                     'score': total_score,
-                    'predicted_wait_time': max(1, int(self.get_current_occupancy_rate(station) / 10)),
+                    'predicted_wait_time': wait_minutes_display(wait_p50),
+                    'wait_time_p90': wait_minutes_display(wait_p90),
                     'distance': distance
                 })
             
@@ -259,11 +336,70 @@ class StationRecommendationEngine:
             print(f"Error in rule_based_recommendations: {e}")
             return []
 
+def refresh_station_caches(station):
+    """Keep the in-process station indexes in sync after a station write"""
+    station_index.update(station)
+    station_features.update(station)
+    station_search.update(station)
+    station_typeahead.update(station)
+    station_availability.invalidate(station.stationId)
+    recommendation_cache.invalidate_near(station.latitude, station.longitude)
+
+
+def rebuild_station_caches():
+    """Rebuild the in-process station indexes after a bulk write"""
+    for cache in (station_index, station_features, station_search, station_typeahead):
+        cache.build()
+    recommendation_cache.invalidate_all()
+
+
+def cached_recommendations(user_location, user_preferences, limit):
+    """Recommendations shared by nearby users asking within the same time bucket"""
+    snapshot = recommendation_engine.registry.get()
+
+    def compute():
+        return [
+            (item['station'].pk, item['score'], item['predicted_wait_time'], item['wait_time_p90'])
+            for item in recommendation_engine.get_recommendations(user_location, user_preferences, limit=limit)
+        ]
+
+    def reach():
+        candidates = station_index.nearest(user_location[0], user_location[1], k=recommendation_engine.candidate_limit)
+        if not candidates:
+            return 0.0
+        lat, lng = station_index.positions.get(candidates[-1], user_location)
+        return float(distance_km(user_location[0], user_location[1], lat, lng))
+
+    ranked = recommendation_cache.get_or_compute(
+        user_location[0], user_location[1], user_preferences.get('charger_type'), limit,
+        snapshot.version if snapshot else 'rules', compute, reach
+    )
+    stations = StationDetails.objects.filter(status='Active').in_bulk([pk for pk, *_ in ranked])
+    recommendations = []
+    for pk, score, wait, wait_p90 in ranked:
+        station = stations.get(pk)
+        if station is None:
+            continue
+        # Distance is per user, not per cell
+        distance = float(distance_km(
+            user_location[0], user_location[1], station.latitude, station.longitude,
+            recommendation_engine.distance_method
+        ))
+        recommendations.append({
+            'station': station, 'score': score, 'predicted_wait_time': wait, 'wait_time_p90': wait_p90,
+            'distance': distance
+        })
+    return recommendations
+
 # Initialize recommendation engine
 try:
     recommendation_engine = StationRecommendationEngine()
+    training_runner = TrainingJobRunner(recommendation_engine.registry.store.root)
 except:
     recommendation_engine = None
+    training_runner = None
+
+recommendation_cache = cache_from_settings()
 
 # Update your existing searchStation function
 def searchStation(request):
@@ -281,11 +417,7 @@ def searchStation(request):
                 user_location = [user_lat, user_lng]
                 user_preferences = {'charger_type': charger_preference}
                 
-                recommendations = recommendation_engine.get_recommendations(
-                    user_location, 
-                    user_preferences, 
-                    limit=6
-                )
+                recommendations = cached_recommendations(user_location, user_preferences, limit=6)
                 show_recommendations = True
                 
             except Exception as e:
@@ -322,26 +454,50 @@ def searchStation(request):
 def train_recommendation_model(request):
     """Admin function to train the ML model"""
     if request.method == 'POST':
-        if recommendation_engine:
-            success = recommendation_engine.train_model()
-            if success:
-                message = "Recommendation model trained successfully!"
+        if training_runner:
+            # Training runs in a background process; the page polls trainModelStatus
+            mode = 'incremental' if request.POST.get('mode') == 'incremental' else 'full'
+            window_days = request.POST.get('window_days') or None
+            if window_days is not None:
+                try:
+                    window_days = int(window_days)
+                except ValueError:
+                    window_days = 0
+                if window_days <= 0:
+                    return JsonResponse({'error': 'window_days must be a positive number of days'}, status=400)
+            job_id = training_runner.submit(mode, window_days)
+            if job_id:
+                message = "Model training started."
             else:
-                message = "Not enough data to train the model. Need at least 5 bookings with user feedback."
+                message = "A training job is already running."
         else:
             message = "Recommendation engine not available."
         
-        return render(request, 'admin_ml_management.html', {'message': message})
+        return render(request, 'admin_ml_management.html', {
+            'message': message,
+            'training_status': training_runner.status() if training_runner else None
+        })
     
     # Show current model status
     context = {
         'model_trained': recommendation_engine.is_trained if recommendation_engine else False,
+        'training_status': training_runner.status() if training_runner else None,
         'total_bookings': SlotBooking.objects.count(),
         'rated_bookings': SlotBooking.objects.exclude(userRemark='-').count()
     }
     
     return render(request, 'admin_ml_management.html', context)
 
+def recommendation_cache_stats(request):
+    """Hit/miss counters of this worker's recommendation cache"""
+    return JsonResponse(recommendation_cache.stats())
+
+def train_recommendation_model_status(request):
+    """Training job progress for the admin page to poll"""
+    if not training_runner:
+        return JsonResponse({'state': 'unavailable'})
+    return JsonResponse(training_runner.status())
+
 
 def updateBookingStatus(request):
     if 'username' not in request.session:
@@ -370,11 +526,32 @@ def updateBookingStatus(request):
 
     if request.method == 'POST':
         id=int(request.POST.get("slotid"))
-        
-        booking = SlotBooking.objects.get(pk=id)
-        booking.stationRemark=request.POST.get('txtremark')
-        booking.status=request.POST.get('ddlstatus')
-        booking.save()
+        new_status = request.POST.get('ddlstatus')
+
+        with transaction.atomic():
+            # Lock the station first, then the booking: admissions for one station run one at a time
+            station_id = SlotBooking.objects.values_list('stationId', flat=True).get(pk=id)
+            station = StationDetails.objects.select_for_update().filter(stationId=station_id).first()
+            booking = SlotBooking.objects.select_for_update().get(pk=id)
+
+            if new_status == 'Accept' and booking.status != 'Accept' and (
+                    station is None or not has_capacity_for(station, booking)):
+                return render(request, 'stationDefault.html', {
+                    'message': f"Cannot accept: all {booking.chargerType} chargers are booked for that slot."
+                })
+
+            old_status = booking.status
+            booking.stationRemark = request.POST.get('txtremark')
+            booking.status = new_status
+            # Only the fields this form owns, so a concurrent userRemark edit is not overwritten
+            booking.save(update_fields=['stationRemark', 'status', 'updated_at'])
+            apply_status_change(booking, old_status, new_status)
+            record_status_change(booking.stationId, old_status, new_status)
+
+        station_features.refresh(booking.stationId)
+        station_availability.invalidate(booking.stationId, booking.arrivalTime)
+        if station is not None:
+            recommendation_cache.invalidate_near(station.latitude, station.longitude)
         return render(request, 'stationDefault.html')
 
 # Create your views here.
@@ -397,9 +574,6 @@ def stationLogin(request):
 
     return render(request, 'stationLogin.html')  
 
-def is_table_empty():
-    return StationDetails.objects.count() == 0
-
 def stationRegistration(request):
     if request.method == 'POST':
         station_name = request.POST.get('txtstation')
@@ -409,23 +583,21 @@ def stationRegistration(request):
         password = request.POST.get('txtPassword')
         city = request.POST.get('txtcity')
 
-        if is_table_empty():
-            new_registration=1
-        else:
-            last_registration = StationDetails.objects.latest('stationId')
-            new_registration=last_registration.stationId+1
-
-        StationDetails.objects.create(
-            stationName=station_name,
-            email=email,
-            mobileNo=mobile_no,
-            username=username,
-            password=password,
-            city=city,
-            Area='-',
-            status='Active',
-            stationId=new_registration
-        )
+        # Allocate and insert in one transaction; the counter row stays locked until commit
+        with transaction.atomic():
+            new_registration = allocate_station_ids()[0]
+            station = StationDetails.objects.create(
+                stationName=station_name,
+                email=email,
+                mobileNo=mobile_no,
+                username=username,
+                password=password,
+                city=city,
+                Area='-',
+                status='Active',
+                stationId=new_registration
+            )
+        refresh_station_caches(station)
 
         # last_registration = StationDetails.objects.latest('stationId')
         message = f"Registration successful. Station ID is: {new_registration}"
@@ -479,6 +651,7 @@ def stationDetails(request):
             stationDetails.Area = request.POST.get('txtArea')
 
             stationDetails.save()
+            refresh_station_caches(stationDetails)
 
         # except:
             # messages.warning(request, 'Kindly fill the details properly')
@@ -492,14 +665,25 @@ def stationDetails(request):
 
     return render(request, 'stationDetails.html', context)
 
+# Fields returned by the JSON variants of the listing views
+BOOKING_JSON_FIELDS = (
+    'id', 'stationId', 'stationName', 'customerName', 'vehicleRegistration', 'chargerType',
+    'arrivalTime', 'status', 'userRemark', 'stationRemark', 'unit', 'time', 'amount'
+)
+STATION_JSON_FIELDS = ('id', 'stationId', 'stationName', 'email', 'mobileNo', 'Area', 'city', 'status')
+
 def stationBooking(request):
     if 'username' not in request.session:
         return redirect('stationLogin')
 
     station_id = request.session.get('stationID', 0)
     bookings = SlotBooking.objects.filter(status__in=['Pending', 'Request Pending'], stationId=station_id)
+    page = keyset_page(bookings, request.GET.get('cursor'), page_size_from(request))
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse(page.to_dict(BOOKING_JSON_FIELDS))
 
-    context = {'bookings': bookings}
+    context = {'bookings': page.items, 'page': page}
     return render(request, 'stationBooking.html', context)
 
 
@@ -510,9 +694,34 @@ def bookingHistory(request):
     if 'username' not in request.session:
         return redirect('stationLogin')
 
-    data = SlotBooking.objects.filter(status__in=['Accept', 'Reject']).order_by('id')
+    # Only this station's bookings; served by the (stationId, status, arrivalTime) index
+    station_id = request.session.get('stationID', 0)
+    data = SlotBooking.objects.filter(stationId=station_id, status__in=['Accept', 'Reject'])
+
+    # Date range on the raw column (not __date) so the index range scan applies
+    date_from = parse_date_param(request.GET.get('from'))
+    date_to = parse_date_param(request.GET.get('to'))
+    if date_from:
+        data = data.filter(arrivalTime__gte=date_from)
+    if date_to:
+        data = data.filter(arrivalTime__lt=date_to + timedelta(days=1))
 
-    return render(request, 'bookingHistory.html', {'data': data})
+    if request.GET.get('format') == 'csv':
+        return stream_csv(data.order_by('arrivalTime', 'id'), BOOKING_JSON_FIELDS, f'booking_history_{station_id}.csv')
+
+    page = keyset_page(data, request.GET.get('cursor'), page_size_from(request), ordering=('arrivalTime',))
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse(page.to_dict(BOOKING_JSON_FIELDS))
+
+    return render(request, 'bookingHistory.html', {'data': page.items, 'page': page})
+
+def parse_date_param(value):
+    """datetime for a YYYY-MM-DD query parameter, or None"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
 
 
 # def searchStation(request):
@@ -542,18 +751,24 @@ def viewStation(request):
     id = request.GET.get("id")
     value = request.GET.get("value")
 
+    # Both searches go through the trigram index, best match first
     if id == "1":
-        stations = StationDetails.objects.filter(status='Active', stationName__icontains=value)
+        stations = search_stations(value, 'name')
     elif id == "2":
-        stations = StationDetails.objects.filter(status='Active').filter(
-            Q(city__icontains=value) | Q(Area__icontains=value) | Q(loc1__icontains=value) |
-            Q(loc2__icontains=value) | Q(loc3__icontains=value) | Q(loc4__icontains=value) |
-            Q(loc5__icontains=value) | Q(loc6__icontains=value)
-        ).order_by('stationName')
+        stations = search_stations(value, 'area')
 
     context = {'stations': stations}
     return render(request, 'viewStation.html', context)
 
+def stationTypeahead(request):
+    """Autocomplete suggestions for station names, cities, areas and landmarks"""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    return JsonResponse({'query': query, 'results': station_typeahead.suggest(query, limit)})
+
 def slotBooking(request):
 # def slotBooking(request, station_id, station_name):
 
@@ -572,35 +787,72 @@ def slotBooking(request):
         vehicle_registration = request.POST.get('txtregistration')
         charger_type = request.POST.get('ddlcharingT')
         # vehicle_types = request.POST.get('rblvehicle')
-        start_date_time = datetime.strptime(request.POST.get('txtSdate') + ' ' + request.POST.get('txtarrivalT'), '%Y-%m-%d %H:%M')
+        start_date_time = booking_time(datetime.strptime(request.POST.get('txtSdate') + ' ' + request.POST.get('txtarrivalT'), '%Y-%m-%d %H:%M'))
         status = 'Request Pending'
         user_remark = '-'
         unit = int(request.POST.get('hfunit'))
         time = int(request.POST.get('hftime'))
         amount = int(request.POST.get('hfamount'))
 
-        SlotBooking.objects.create(
-            stationId=station_id,
-            stationName=station_name,
-            customerName=customer_name,
-            vehicleRegistration=vehicle_registration,
-            chargerType=charger_type,
-            # vehicleTypes=vehicle_types,
-            # startDateTime=start_date_time,
-            # endDateTime=None,
-            arrivalTime=start_date_time,
-            status=status,
-            userRemark=user_remark,
-            stationRemark='-',
-            unit=unit,
-            time=time,
-            amount=amount
-        )
+        # Refuse the request when every charger of that type is held for part of the slot
+        station = StationDetails.objects.filter(stationId=station_id).first()
+        if station and not station_availability.is_free(station, charger_type, start_date_time, time, fresh=True):
+            next_slot = station_availability.next_free_slot(station, charger_type, start_date_time, time)
+            if next_slot:
+                message = f"No charger free at that time. Next free slot: {next_slot:%Y-%m-%d %H:%M}"
+            else:
+                message = "No charger of this type is free in the coming week."
+            return render(request, 'slotBooking.html', {
+                'station_id': station_id, 'station_name': station_name, 'message': message
+            })
+
+        with transaction.atomic():
+            booking = SlotBooking.objects.create(
+                stationId=station_id,
+                stationName=station_name,
+                customerName=customer_name,
+                vehicleRegistration=vehicle_registration,
+                chargerType=charger_type,
+                # vehicleTypes=vehicle_types,
+                # startDateTime=start_date_time,
+                # endDateTime=None,
+                arrivalTime=start_date_time,
+                status=status,
+                userRemark=user_remark,
+                stationRemark='-',
+                unit=unit,
+                time=time,
+                amount=amount
+            )
+            apply_status_change(booking, None, status)
+
+        station_availability.invalidate(station_id, start_date_time)
 
         message = "Slot Request successful..!"
         return render(request, 'searchStation.html', {'message': message })
     
 
+def slotAvailability(request):
+    """JSON: free chargers of a type at a time, and the next free slot for a duration"""
+    station = StationDetails.objects.filter(stationId=request.GET.get('station') or 0).first()
+    if station is None:
+        return JsonResponse({'error': 'Unknown station'}, status=404)
+    try:
+        at = booking_time(datetime.strptime(request.GET.get('at', ''), '%Y-%m-%dT%H:%M'))
+        minutes = int(request.GET.get('minutes', 30))
+    except ValueError:
+        return JsonResponse({'error': 'Expected at=YYYY-MM-DDTHH:MM and integer minutes'}, status=400)
+
+    charger_type = request.GET.get('type', 'fastCharger')
+    next_slot = station_availability.next_free_slot(station, charger_type, at, minutes)
+    return JsonResponse({
+        'station': station.stationId,
+        'type': charger_type,
+        'free_chargers': station_availability.free_chargers(station, charger_type, at),
+        'available': station_availability.is_free(station, charger_type, at, minutes),
+        'next_free_slot': next_slot,
+    })
+
 def userStatus(request):
     if request.method == 'POST':
         txtusername = request.POST.get('txtusername')
@@ -621,9 +873,26 @@ def userStatusUpdate(request):
 
     if request.method == 'POST':
         slot_id=request.POST.get('slotId')
-        slot_booking = SlotBooking.objects.get(pk=slot_id)
-        slot_booking.userRemark = request.POST.get('txtremark')
-        slot_booking.save()
+        rating = parse_rating(request.POST.get('ddlrating'))
+
+        with transaction.atomic():
+            # Same lock order as updateBookingStatus: station row, then booking
+            station_id = SlotBooking.objects.values_list('stationId', flat=True).get(pk=slot_id)
+            station = StationDetails.objects.select_for_update().filter(stationId=station_id).first()
+            slot_booking = SlotBooking.objects.select_for_update().get(pk=slot_id)
+            old_rating = slot_booking.user_rating
+            slot_booking.userRemark = request.POST.get('txtremark')
+            update_fields = ['userRemark', 'updated_at']
+            if rating is not None:
+                slot_booking.user_rating = rating
+                update_fields.append('user_rating')
+            slot_booking.save(update_fields=update_fields)
+            record_rating(station_id, old_rating, rating)
+
+        if rating is not None and rating != old_rating:
+            station_features.refresh(station_id)
+            if station is not None:
+                recommendation_cache.invalidate_near(station.latitude, station.longitude)
         message = "Slot Request successful..!"
         # return redirect('searchStation')
         return render(request, 'searchStation.html', {'message': message })
@@ -651,7 +920,8 @@ def userStatusUpdate(request):
             'unit':booking.unit,
             'time':booking.time,
             'amount':booking.amount,
-            'chargerType':booking.chargerType
+            'chargerType':booking.chargerType,
+            'userRating': booking.user_rating
             }
             return render(request, 'userStatusUpdate.html', context)
 
@@ -667,6 +937,7 @@ def adminLogin(request):
         password = request.POST.get('txtpwd')
 
         if username == "admin" and password == "super":
+            request.session['admin'] = True
             return redirect('adminDefault')  
         else:
             messages.error(request, 'Invalid Username and Password!')
@@ -679,14 +950,59 @@ def adminDefault(request):
 def adminMaster(request):
     return render(request, 'adminMaster.html')
 
+def adminImportStations(request):
+    """Admin upload of a CSV or JSON station feed; existing stations are only updated on request"""
+    if not request.session.get('admin'):
+        return JsonResponse({'error': 'Admin login required'}, status=403)
+    if request.method != 'POST' or 'stationFile' not in request.FILES:
+        return JsonResponse({'error': 'POST a stationFile upload'}, status=400)
+
+    upload = request.FILES['stationFile']
+    fmt = request.POST.get('format') or ('json' if upload.name.lower().endswith(('.json', '.jsonl')) else 'csv')
+    update_existing = request.POST.get('update_existing', '0') == '1'
+    textfile = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        rows = iter_json(textfile) if fmt == 'json' else iter_csv(textfile)
+        result = import_stations(rows, update_existing=update_existing)
+    except (ValueError, UnicodeDecodeError) as e:
+        print(f"Error importing stations: {e}")
+        return JsonResponse({'error': f'Unreadable {fmt} file: {e}'}, status=400)
+
+    if result.created or result.updated:
+        rebuild_station_caches()
+    return JsonResponse(result.as_dict())
+
+def exportBookings(request):
+    """Streaming CSV/Parquet export of the logged-in station's bookings, filtered by status and date range"""
+    if 'username' not in request.session or 'stationID' not in request.session:
+        return redirect('stationLogin')
+
+    station_id = request.session['stationID']
+    bookings = booking_export_queryset(
+        station_id=station_id,
+        status=request.GET.get('status'),
+        date_from=parse_date_param(request.GET.get('from')),
+        date_to=parse_date_param(request.GET.get('to')),
+    )
+    if request.GET.get('format') == 'parquet':
+        if pq is None:
+            return JsonResponse({'error': 'Parquet export needs pyarrow installed'}, status=501)
+        return stream_parquet(bookings, BOOKING_EXPORT_FIELDS, f'bookings_{station_id}.parquet')
+    return stream_csv(bookings, BOOKING_EXPORT_FIELDS, f'bookings_{station_id}.csv')
+
 def stationList(request):
-    stations = StationDetails.objects.all()
-    return render(request, 'stationList.html', {'stations': stations})
+    page = keyset_page(StationDetails.objects.all(), request.GET.get('cursor'), page_size_from(request))
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse(page.to_dict(STATION_JSON_FIELDS))
+
+    return render(request, 'stationList.html', {'stations': page.items, 'page': page})
 
 def change_status(request, station_id):
     station = StationDetails.objects.get(stationId=int(station_id))
 
     station.status = 'Inactive' if station.status == 'Active' else 'Active'
     station.save()
+    refresh_station_caches(station)
 
     return redirect('stationList')  
\ No newline at end of file
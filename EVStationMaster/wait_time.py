@@ -0,0 +1,117 @@
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+
+from EVStationMaster.features import FEATURE_NAMES
+
+QUANTILES = (0.5, 0.9)
+
+# Service time (minutes) per charger type when no bookings have been seen yet
+DEFAULT_SERVICE_MINUTES = {'rapidcharger': 30.0, 'fastCharger': 60.0, 'slowcharger': 180.0}
+
+# Hours a day stations take bookings; spreads today's accepted count into an arrival rate
+OPEN_HOURS = 12
+
+RAPID, FAST, SLOW = (FEATURE_NAMES.index(name) for name in ('rapidcharger', 'fastCharger', 'slowcharger'))
+OCCUPANCY = FEATURE_NAMES.index('occupancy_rate')
+
+# Station and time columns of the feature matrix. Wait does not depend on the user:
+# training rows carry distance from a fixed origin and no charger preference, so
+# distance_km and charger_pref would differ between training and serving.
+WAIT_FEATURES = (
+    'rapidcharger', 'fastCharger', 'slowcharger', 'Pspaces', 'average_rating', 'total_bookings',
+    'amenities_score', 'occupancy_rate', 'hour', 'day_of_week', 'is_weekend', 'is_peak_hour'
+)
+WAIT_COLUMNS = [FEATURE_NAMES.index(name) for name in WAIT_FEATURES]
+
+
+class WaitTimeModel:
+    """One quantile gradient-boosted model per quantile, on the WAIT_FEATURES columns of the feature matrix"""
+
+    def __init__(self, quantiles=QUANTILES, n_estimators=100, max_depth=3, learning_rate=0.1):
+        self.feature_names = WAIT_FEATURES
+        self.quantiles = tuple(quantiles)
+        self.models = [
+            GradientBoostingRegressor(loss='quantile', alpha=q, n_estimators=n_estimators,
+                                      max_depth=max_depth, learning_rate=learning_rate, random_state=42)
+            for q in self.quantiles
+        ]
+
+    def fit(self, X, y):
+        """Fit on full feature matrix rows; only the WAIT_FEATURES columns are used"""
+        X = np.asarray(X)[:, WAIT_COLUMNS]
+        for model in self.models:
+            model.fit(X, y)
+        return self
+
+    def predict(self, X):
+        """N x len(quantiles) wait minutes, non-negative and non-decreasing across quantiles"""
+        X = np.asarray(X)[:, WAIT_COLUMNS]
+        predictions = np.column_stack([model.predict(X) for model in self.models])
+        return np.maximum.accumulate(np.maximum(predictions, 0), axis=1)
+
+
+def erlang_c(servers, offered_load):
+    """Probability an arrival has to queue in M/M/c, vectorised over stations
+
+    servers must be >= 1 and offered_load < servers.
+    """
+    servers = np.asarray(servers, dtype=float)
+    offered_load = np.asarray(offered_load, dtype=float)
+    term = np.ones_like(offered_load)  # a^k / k!
+    below = np.zeros_like(offered_load)  # sum over k < c
+    for k in range(int(servers.max(initial=1))):
+        below += np.where(k < servers, term, 0.0)
+        term = np.where(k < servers, term * offered_load / (k + 1), term)
+    top = term * servers / (servers - offered_load)
+    return top / (below + top)
+
+
+def queueing_wait(chargers, occupancy_rate, service_minutes=None, quantiles=QUANTILES):
+    """Wait-minute quantiles from an M/M/c queue per station, when no trained model exists
+
+    chargers is N x 3 (rapid, fast, slow counts). Servers are the station's chargers,
+    service time is their capacity-weighted mean, and the arrival rate spreads today's
+    accepted bookings (occupancy_rate % of capacity) over OPEN_HOURS.
+    """
+    service = dict(DEFAULT_SERVICE_MINUTES, **(service_minutes or {}))
+    chargers = np.asarray(chargers, dtype=float).reshape(-1, 3)
+    servers = chargers.sum(axis=1)
+    weights = np.array([service['rapidcharger'], service['fastCharger'], service['slowcharger']])
+    mean_service = np.divide(chargers @ weights, servers, out=np.full(len(chargers), weights.mean()),
+                             where=servers > 0)
+
+    accepted = np.asarray(occupancy_rate, dtype=float) * servers / 100
+    arrival_rate = accepted / (OPEN_HOURS * 60)  # per minute
+    safe_servers = np.maximum(servers, 1)
+    # Saturated stations are treated as almost full rather than unbounded
+    offered_load = np.minimum(arrival_rate * mean_service, 0.95 * safe_servers)
+    queue_probability = erlang_c(safe_servers, offered_load)
+    drain_rate = (safe_servers - offered_load) / mean_service  # per minute
+
+    waits = np.column_stack([
+        np.log(np.maximum(queue_probability / (1 - q), 1.0)) / drain_rate for q in quantiles
+    ])
+    # No chargers of any kind: nothing will free up
+    waits[servers == 0] = np.nan
+    return waits
+
+
+def predict_wait(snapshot, features):
+    """(p50, p90) wait minutes for each feature row through the snapshot's wait model"""
+    if len(features) == 0:
+        return np.zeros(0), np.zeros(0)
+    wait_model = getattr(snapshot, 'wait_model', None) if snapshot is not None else None
+    # Models saved before WAIT_FEATURES were fit on every column; use the queueing estimate until retrained
+    if wait_model is not None and getattr(wait_model, 'feature_names', None) == WAIT_FEATURES:
+        waits = wait_model.predict(features)
+    else:
+        metadata = snapshot.metadata if snapshot is not None else {}
+        waits = queueing_wait(features[:, [RAPID, FAST, SLOW]], features[:, OCCUPANCY], metadata.get('service_minutes'))
+    return waits[:, 0], waits[:, -1]
+
+
+def wait_minutes_display(minutes):
+    """Whole minutes for the UI; at least 1, matching the old heuristic's floor"""
+    if minutes is None or np.isnan(minutes):
+        return None
+    return max(1, int(round(minutes)))